@@ -3,7 +3,7 @@
 DeepSeek-OCR Service - FastAPI микросервис для OCR
 
 Использует DeepSeek-OCR модель с методом model.infer().
-Поддерживает flash_attention_2 (если установлен).
+Поддерживает flash_attention_2 (если установлен), иначе SDPA.
 
 Универсальный Docker для разных GPU:
 - RTX 4080/4090 (sm_89, Ada Lovelace)
@@ -13,19 +13,30 @@ DeepSeek-OCR Service - FastAPI микросервис для OCR
 
 import os
 import io
-import base64
+import re
 import time
+import shutil
 import tempfile
 import logging
 import sys
-from io import StringIO
-from typing import Optional, List
-from contextlib import asynccontextmanager
+from typing import Optional, List, Tuple
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+
+try:
+    import pybase64 as base64  # SIMD-декодирование base64
+except ImportError:
+    import base64
+
+# Настройки аллокатора CUDA задаются до импорта torch: расширяемые сегменты
+# снижают фрагментацию VRAM при изображениях разного размера
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:128")
 
 import torch
-from PIL import Image
+from PIL import Image, ImageOps
 from fastapi import FastAPI, HTTPException, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel
 
 # Настройка логирования
@@ -36,12 +47,29 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = os.getenv("DEEPSEEK_MODEL", "deepseek-ai/DeepSeek-OCR")
 USE_FLASH_ATTENTION = os.getenv("USE_FLASH_ATTENTION", "auto")
 MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "4096"))
+VRAM_FRACTION = float(os.getenv("VRAM_FRACTION", "0.9"))
+HEALTH_VRAM_TTL = 1.0  # сек, кэш VRAM для /health
+TORCH_VERSION = tuple(int(part) for part in torch.__version__.split("+")[0].split(".")[:2])
 
 # Глобальные переменные
 model = None
 tokenizer = None
 device_info = {}
 flash_attn_available = False
+attn_implementation = "eager"
+# Рабочая директория model.infer() (save_results=False - файлы не пишутся),
+# создаётся один раз на процесс
+ocr_output_dir: Optional[str] = None
+vram_cache = {"time": 0.0, "value": (0.0, 0.0)}
+
+# Изображение текущего запроса (передаётся в model.infer без записи на диск)
+_current_image: ContextVar[Optional[Image.Image]] = ContextVar("ocr_image", default=None)
+# model.infer требует непустой image_file; реальный путь не используется
+IN_MEMORY_IMAGE = "memory://image"
+
+# Разметка блоков: <|ref|>text<|/ref|><|det|>(x0,y0),(x1,y1)<|/det|>
+BBOX_RE = re.compile(r"<\|ref\|>(.*?)<\|/ref\|><\|det\|>(.*?)<\|/det\|>")
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
 
 
 class BBox(BaseModel):
@@ -89,6 +117,22 @@ PROMPTS = {
 }
 
 
+def vram_gb(ttl: float = 0.0) -> Tuple[float, float]:
+    """
+    Свободная и общая VRAM (GB) за один вызов mem_get_info()
+
+    Args:
+        ttl: Допустимый возраст закэшированного значения, сек (0 - без кэша)
+    """
+    now = time.monotonic()
+    if ttl and now - vram_cache["time"] < ttl:
+        return vram_cache["value"]
+    free, total = torch.cuda.mem_get_info()
+    vram_cache["value"] = (free / 1024**3, total / 1024**3)
+    vram_cache["time"] = now
+    return vram_cache["value"]
+
+
 def check_flash_attention() -> bool:
     """Проверка доступности flash_attn"""
     global flash_attn_available
@@ -108,21 +152,139 @@ def check_flash_attention() -> bool:
         return False
 
 
+def decode_image(image_data: bytes) -> Image.Image:
+    """Декодирование изображения из байтов (как load_pil_images в DeepSeek-OCR)"""
+    image = Image.open(io.BytesIO(image_data))
+    image = ImageOps.exif_transpose(image)
+    return image.convert("RGB")
+
+
+def patch_image_loader():
+    """
+    Подмена load_pil_images в remote-коде DeepSeek-OCR.
+
+    model.infer() открывает изображение по пути image_file. Подменённый
+    загрузчик возвращает уже декодированное изображение текущего запроса,
+    поэтому временный файл не нужен.
+    """
+    module = sys.modules.get(type(model).__module__)
+    original = getattr(module, "load_pil_images", None)
+    if original is None:
+        raise RuntimeError("load_pil_images не найден в коде модели DeepSeek-OCR")
+
+    def load_pil_images(conversations):
+        image = _current_image.get()
+        if image is None:
+            return original(conversations)
+        return [image]
+
+    module.load_pil_images = load_pil_images
+
+
+def sdpa_context():
+    """Выбор SDPA-ядер (flash / memory-efficient, math - запасной) на время генерации"""
+    if attn_implementation != "sdpa" or TORCH_VERSION < (2, 2):
+        return nullcontext()
+    # math остаётся последним вариантом: формы и маски, которые не берут
+    # flash / memory-efficient, не должны падать с "No available kernel"
+    if TORCH_VERSION >= (2, 3):
+        from torch.nn.attention import SDPBackend, sdpa_kernel
+        return sdpa_kernel([
+            SDPBackend.FLASH_ATTENTION,
+            SDPBackend.EFFICIENT_ATTENTION,
+            SDPBackend.MATH,
+        ])
+    # torch 2.2: sdpa_kernel ещё нет (sdp_kernel устарел начиная с 2.3)
+    return torch.backends.cuda.sdp_kernel(
+        enable_flash=True,
+        enable_math=True,
+        enable_mem_efficient=True
+    )
+
+
+def run_infer(image: Image.Image, prompt: str, **kwargs) -> str:
+    """
+    Вызов model.infer() для изображения в памяти
+
+    eval_mode=True: infer() возвращает распознанный текст вместо печати
+    в stdout, поэтому перехват sys.stdout не нужен.
+    """
+    token = _current_image.set(image)
+    try:
+        with torch.inference_mode(), sdpa_context():
+            res = model.infer(
+                tokenizer,
+                prompt=prompt,
+                image_file=IN_MEMORY_IMAGE,
+                eval_mode=True,
+                **kwargs
+            )
+        return res if isinstance(res, str) else ""
+    finally:
+        _current_image.reset(token)
+
+
+def plain_text_lines(text: str) -> List[str]:
+    """Непустые строки без служебных тегов"""
+    return [line.strip() for line in text.split('\n') if line.strip() and not line.startswith('<|')]
+
+
+def parse_blocks(raw_output: str) -> Tuple[List[OCRBlock], str]:
+    """
+    Парсинг вывода модели: блоки по совпадениям BBOX_RE,
+    текст между ними - построчно в markdown
+
+    Returns:
+        (блоки с bbox, markdown)
+    """
+    blocks = []
+    markdown_lines = []
+    position = 0
+    
+    for match in BBOX_RE.finditer(raw_output):
+        markdown_lines.extend(plain_text_lines(raw_output[position:match.start()]))
+        position = match.end()
+        
+        coords = NUMBER_RE.findall(match.group(2))
+        if len(coords) < 4:
+            logger.warning(f"Ошибка парсинга блока: {match.group(0)[:100]}")
+            continue
+        
+        text = match.group(1).strip()
+        blocks.append(OCRBlock(
+            id=f"ocr_block_{len(blocks)}",
+            type="text",
+            content=text,
+            bbox=BBox(
+                x0=float(coords[0]),
+                y0=float(coords[1]),
+                x1=float(coords[2]),
+                y1=float(coords[3])
+            )
+        ))
+        markdown_lines.append(text)
+    
+    markdown_lines.extend(plain_text_lines(raw_output[position:]))
+    return blocks, '\n'.join(markdown_lines)
+
+
 def load_model():
     """Загрузка модели DeepSeek-OCR"""
-    global model, tokenizer, device_info, flash_attn_available
+    global model, tokenizer, device_info, flash_attn_available, attn_implementation
     
     logger.info(f"Загрузка модели: {MODEL_NAME}")
     
     # Проверка CUDA
     if not torch.cuda.is_available():
         raise RuntimeError("CUDA недоступна!")
+    torch.cuda.set_per_process_memory_fraction(VRAM_FRACTION)
     
+    vram_free, vram_total = vram_gb()
     device_info = {
         "cuda_available": True,
         "cuda_device": torch.cuda.get_device_name(0),
-        "vram_total": torch.cuda.mem_get_info()[1] / 1024**3,
-        "vram_free": torch.cuda.mem_get_info()[0] / 1024**3,
+        "vram_total": vram_total,
+        "vram_free": vram_free,
     }
     logger.info(f"GPU: {device_info['cuda_device']}, VRAM: {device_info['vram_free']:.1f}GB free")
     
@@ -137,30 +299,61 @@ def load_model():
         attn_impl = "flash_attention_2"
         logger.info("Используем Flash Attention 2")
     else:
-        attn_impl = "eager"
-        logger.info("Используем eager attention")
+        # Встроенный FlashAttention PyTorch (F.scaled_dot_product_attention)
+        attn_impl = "sdpa"
+        logger.info("Используем SDPA attention")
+    
+    load_kwargs = {
+        "torch_dtype": torch.bfloat16,
+        "device_map": "cuda",
+        "trust_remote_code": True,
+        "use_safetensors": True,
+        "low_cpu_mem_usage": True,
+    }
     
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
-    model = AutoModel.from_pretrained(
-        MODEL_NAME,
-        _attn_implementation=attn_impl,
-        torch_dtype=torch.bfloat16,
-        device_map="cuda",
-        trust_remote_code=True,
-        use_safetensors=True,
-        low_cpu_mem_usage=True
-    )
+    try:
+        model = AutoModel.from_pretrained(MODEL_NAME, _attn_implementation=attn_impl, **load_kwargs)
+    except ValueError as e:
+        if attn_impl != "sdpa":
+            raise
+        logger.warning(f"SDPA не поддерживается моделью ({e}), используем eager attention")
+        attn_impl = "eager"
+        model = AutoModel.from_pretrained(MODEL_NAME, _attn_implementation=attn_impl, **load_kwargs)
+    attn_implementation = attn_impl
     model.eval()
+    patch_image_loader()
+    warmup()
     
-    logger.info(f"Модель загружена! VRAM: {torch.cuda.mem_get_info()[0] / 1024**3:.1f}GB free")
+    logger.info(f"Модель загружена! VRAM: {vram_gb()[0]:.1f}GB free")
+
+
+def warmup():
+    """Прогрев: автотюнинг ядер cuDNN/cuBLAS до первого запроса (оба режима crop_mode)"""
+    start_time = time.time()
+    image = Image.new("RGB", (1024, 1024), "white")
+    for crop_mode in (False, True):
+        run_infer(
+            image,
+            PROMPTS["ocr_simple"],
+            output_path=ocr_output_dir,
+            base_size=1024,
+            image_size=1024,
+            crop_mode=crop_mode,
+            save_results=False,
+            test_compress=False
+        )
+    logger.info(f"Warmup done in {time.time() - start_time:.1f}s")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle management"""
+    global model, tokenizer, ocr_output_dir
+    ocr_output_dir = tempfile.mkdtemp(prefix="ocr-")
     load_model()
     yield
-    global model, tokenizer
+    shutil.rmtree(ocr_output_dir, ignore_errors=True)
     del model
     del tokenizer
     torch.cuda.empty_cache()
@@ -170,7 +363,8 @@ app = FastAPI(
     title="DeepSeek-OCR Service",
     description="Universal OCR service with DeepSeek-OCR model",
     version="1.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -180,8 +374,7 @@ async def health():
     vram_free = 0
     vram_total = 0
     if torch.cuda.is_available():
-        vram_free = torch.cuda.mem_get_info()[0] / 1024**3
-        vram_total = torch.cuda.mem_get_info()[1] / 1024**3
+        vram_free, vram_total = vram_gb(ttl=HEALTH_VRAM_TTL)
     
     return HealthResponse(
         status="healthy" if model is not None else "loading",
@@ -229,106 +422,38 @@ async def ocr_figure(
     start_time = time.time()
     
     try:
-        # Читаем изображение
+        # Читаем изображение (декодируем один раз, без временного файла)
         image_data = await file.read()
+        image = decode_image(image_data)
         
-        # Сохраняем во временный файл
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-            tmp_file.write(image_data)
-            temp_path = tmp_file.name
+        # Выбор промпта
+        prompt = custom_prompt if custom_prompt else PROMPTS.get(prompt_type, PROMPTS["ocr_simple"])
+        logger.info(f"Prompt: {prompt[:50]}...")
         
-        try:
-            # Выбор промпта
-            prompt = custom_prompt if custom_prompt else PROMPTS.get(prompt_type, PROMPTS["ocr_simple"])
-            logger.info(f"Prompt: {prompt[:50]}...")
-            
-            # Временная директория для результатов
-            with tempfile.TemporaryDirectory() as tmp_output:
-                # Захват stdout (model.infer печатает результат)
-                old_stdout = sys.stdout
-                sys.stdout = captured_output = StringIO()
-                
-                try:
-                    res = model.infer(
-                        tokenizer,
-                        prompt=prompt,
-                        image_file=temp_path,
-                        output_path=tmp_output,
-                        base_size=base_size,
-                        image_size=image_size,
-                        crop_mode=crop_mode,
-                        save_results=False,
-                        test_compress=False
-                    )
-                finally:
-                    sys.stdout = old_stdout
-                    captured_stdout = captured_output.getvalue()
-                
-                # Определение результата
-                if captured_stdout and len(captured_stdout) > 10:
-                    raw_output = captured_stdout
-                elif res is not None and str(res) != "None":
-                    raw_output = res if isinstance(res, str) else str(res)
-                else:
-                    raw_output = captured_stdout or ""
-                
-                inference_time = time.time() - start_time
-                
-                # Парсинг результата
-                blocks = []
-                markdown_lines = []
-                block_counter = 0
-                
-                lines = raw_output.split('\n')
-                for line in lines:
-                    # Парсинг bbox формата: <|ref|>text<|/ref|><|det|>(x0,y0),(x1,y1)<|/det|>
-                    if '<|ref|>' in line and '<|det|>' in line:
-                        try:
-                            # Извлечение текста
-                            ref_start = line.find('<|ref|>') + 7
-                            ref_end = line.find('<|/ref|>')
-                            text = line[ref_start:ref_end].strip()
-                            
-                            # Извлечение координат
-                            det_start = line.find('<|det|>') + 7
-                            det_end = line.find('<|/det|>')
-                            coords = line[det_start:det_end]
-                            
-                            # Парсинг координат (x0,y0),(x1,y1)
-                            coords = coords.strip('()').replace('),(', ',').split(',')
-                            if len(coords) >= 4:
-                                bbox = BBox(
-                                    x0=float(coords[0]),
-                                    y0=float(coords[1]),
-                                    x1=float(coords[2]),
-                                    y1=float(coords[3])
-                                )
-                                
-                                blocks.append(OCRBlock(
-                                    id=f"ocr_block_{block_counter}",
-                                    type="text",
-                                    content=text,
-                                    bbox=bbox
-                                ))
-                                markdown_lines.append(text)
-                                block_counter += 1
-                        except Exception as e:
-                            logger.warning(f"Ошибка парсинга блока: {e}")
-                    elif line.strip() and not line.startswith('<|'):
-                        markdown_lines.append(line.strip())
-                
-                return OCRResponse(
-                    blocks=blocks,
-                    markdown='\n'.join(markdown_lines),
-                    raw_output=raw_output[:2000],  # Ограничиваем размер
-                    inference_time=round(inference_time, 2),
-                    flash_attention=flash_attn_available
-                )
+        raw_output = run_infer(
+            image,
+            prompt,
+            output_path=ocr_output_dir,
+            base_size=base_size,
+            image_size=image_size,
+            crop_mode=crop_mode,
+            save_results=False,
+            test_compress=False
+        )
         
-        finally:
-            # Удаление временного файла
-            os.unlink(temp_path)
-    
+        inference_time = time.time() - start_time
+        
+        # Парсинг результата вне event loop
+        blocks, markdown = await run_in_threadpool(parse_blocks, raw_output)
+        
+        return OCRResponse(
+            blocks=blocks,
+            markdown=markdown,
+            raw_output=raw_output[:2000],  # Ограничиваем размер
+            inference_time=round(inference_time, 2),
+            flash_attention=flash_attn_available
+        )
+
     except Exception as e:
         logger.error(f"OCR error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -351,44 +476,28 @@ async def ocr_base64(request: dict):
         
         # Декодирование base64
         image_data = base64.b64decode(image_b64)
-        
-        # Сохраняем во временный файл
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-            tmp_file.write(image_data)
-            temp_path = tmp_file.name
+        image = decode_image(image_data)
         
         start_time = time.time()
         
-        try:
-            prompt = PROMPTS.get(prompt_type, PROMPTS["ocr_simple"])
-            
-            with tempfile.TemporaryDirectory() as tmp_output:
-                old_stdout = sys.stdout
-                sys.stdout = captured_output = StringIO()
-                
-                try:
-                    res = model.infer(
-                        tokenizer,
-                        prompt=prompt,
-                        image_file=temp_path,
-                        output_path=tmp_output,
-                        save_results=False
-                    )
-                finally:
-                    sys.stdout = old_stdout
-                    raw_output = captured_output.getvalue()
-                
-                inference_time = time.time() - start_time
-                
-                return {
-                    "text": raw_output.strip(),
-                    "model": MODEL_NAME,
-                    "inference_time": round(inference_time, 2),
-                    "flash_attention": flash_attn_available
-                }
-        finally:
-            os.unlink(temp_path)
-    
+        prompt = PROMPTS.get(prompt_type, PROMPTS["ocr_simple"])
+        
+        raw_output = run_infer(
+            image,
+            prompt,
+            output_path=ocr_output_dir,
+            save_results=False
+        )
+        
+        inference_time = time.time() - start_time
+        
+        return {
+            "text": raw_output.strip(),
+            "model": MODEL_NAME,
+            "inference_time": round(inference_time, 2),
+            "flash_attention": flash_attn_available
+        }
+
     except Exception as e:
         logger.error(f"OCR error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -396,4 +505,5 @@ async def ocr_base64(request: dict):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Один worker: модель занимает единственный GPU
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -5,23 +5,45 @@ Qwen VLM OCR Service - FastAPI микросервис для VLM OCR
 Развёртывается в Docker на машине с достаточным VRAM (24GB+ для 7B).
 Предоставляет REST API для OCR изображений.
 
+Бэкенд инференса (INFERENCE_BACKEND):
+    transformers - HF model.generate() (по умолчанию)
+    vllm         - vLLM AsyncLLMEngine (PagedAttention, continuous batching)
+
+Для transformers параллельные запросы объединяются в батч (до MAX_BATCH_SIZE за
+BATCH_TIMEOUT_MS) и обрабатываются одним вызовом model.generate().
+
 Endpoints:
     POST /ocr - распознать текст на изображении
+    POST /ocr/stream - то же, с потоковой выдачей текста (NDJSON)
     GET /health - проверка состояния сервиса
     GET /info - информация о модели
 """
 
 import os
 import io
-import base64
+import math
 import time
-from typing import Optional
+import asyncio
+import threading
+import uuid
+from functools import lru_cache
+from typing import Optional, List, NamedTuple, Tuple, AsyncIterator
 from contextlib import asynccontextmanager
 
+try:
+    import pybase64 as base64  # SIMD-декодирование base64
+except ImportError:
+    import base64
+
+# Настройки аллокатора CUDA задаются до импорта torch: расширяемые сегменты
+# снижают фрагментацию VRAM при изображениях разного размера
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:128")
+
 import torch
+import orjson
 from PIL import Image
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 # Конфигурация через environment variables
@@ -30,11 +52,47 @@ USE_FLASH_ATTENTION = os.getenv("USE_FLASH_ATTENTION", "false").lower() == "true
 MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "2048"))
 MAX_PIXELS = int(os.getenv("MAX_PIXELS", str(1280 * 28 * 28)))
 MIN_PIXELS = int(os.getenv("MIN_PIXELS", str(256 * 28 * 28)))
+VRAM_FRACTION = float(os.getenv("VRAM_FRACTION", "0.9"))
+HEALTH_VRAM_TTL = 1.0  # сек, кэш VRAM для /health
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "transformers").lower()
+QUANTIZE = os.getenv("QUANTIZE", "none").lower()  # int8 | fp8 | none
+ENABLE_PREFIX_CACHING = os.getenv("ENABLE_PREFIX_CACHING", "true").lower() == "true"
+# Выкл. по умолчанию: каждая новая форма входа (число image-токенов, размер
+# батча) - перекомпиляция и новый захват CUDA Graph
+USE_TORCH_COMPILE = os.getenv("USE_TORCH_COMPILE", "false").lower() == "true"
+TORCH_VERSION = tuple(int(part) for part in torch.__version__.split("+")[0].split(".")[:2])
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+BATCH_TIMEOUT_MS = int(os.getenv("BATCH_TIMEOUT_MS", "10"))
+
+# libjpeg-turbo (SIMD) для декодирования JPEG, если установлен
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    turbo_jpeg = None
 
 # Глобальные переменные для модели
 model = None
+engine = None  # vLLM AsyncLLMEngine (INFERENCE_BACKEND=vllm)
 processor = None
 device_info = {}
+torch_compiled = False
+copy_stream = None  # CUDA stream для копирования входов на GPU
+vram_cache = {"time": 0.0, "value": (0.0, 0.0)}
+# Батчер и потоковые запросы не вызывают model.generate() одновременно
+generation_lock = threading.Lock()
+
+# Очередь запросов для micro-batching
+request_queue: Optional[asyncio.Queue] = None
+batcher_task: Optional[asyncio.Task] = None
+
+
+class PendingRequest(NamedTuple):
+    """Запрос в очереди на генерацию"""
+    text: str
+    images: list
+    max_tokens: int
+    future: asyncio.Future
 
 
 class OCRRequest(BaseModel):
@@ -66,7 +124,10 @@ class InfoResponse(BaseModel):
     """Информация о сервисе"""
     model: str
     max_tokens: int
+    backend: str
+    quantization: str
     flash_attention: bool
+    torch_compile: bool
     cuda_version: str
     torch_version: str
 
@@ -79,15 +140,31 @@ PROMPTS = {
 }
 
 
-def load_model():
-    """Загрузка модели при старте"""
-    global model, processor, device_info
+def vram_gb(ttl: float = 0.0) -> Tuple[float, float]:
+    """
+    Свободная и общая VRAM (GB) за один вызов mem_get_info()
+
+    Args:
+        ttl: Допустимый возраст закэшированного значения, сек (0 - без кэша)
+    """
+    now = time.monotonic()
+    if ttl and now - vram_cache["time"] < ttl:
+        return vram_cache["value"]
+    free, total = torch.cuda.mem_get_info()
+    vram_cache["value"] = (free / 1024**3, total / 1024**3)
+    vram_cache["time"] = now
+    return vram_cache["value"]
+
+
+def load_hf_model():
+    """Загрузка модели transformers"""
+    global model, torch_compiled, copy_stream
     
-    print(f"🚀 Loading model: {MODEL_NAME}")
-    print(f"   Flash Attention: {USE_FLASH_ATTENTION}")
-    print(f"   Max tokens: {MAX_NEW_TOKENS}")
+    from transformers import Qwen2VLForConditionalGeneration
     
-    from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+    if torch.cuda.is_available():
+        torch.cuda.set_per_process_memory_fraction(VRAM_FRACTION)
+        copy_stream = torch.cuda.Stream()
     
     # Определение параметров загрузки
     load_kwargs = {
@@ -99,25 +176,100 @@ def load_model():
     if USE_FLASH_ATTENTION:
         load_kwargs["attn_implementation"] = "flash_attention_2"
     
+    # INT8 веса (bitsandbytes); vision encoder остаётся в bf16
+    if QUANTIZE == "int8":
+        from transformers import BitsAndBytesConfig
+        load_kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_8bit=True,
+            llm_int8_skip_modules=["visual"]
+        )
+    
     # Загрузка модели
     model = Qwen2VLForConditionalGeneration.from_pretrained(
         MODEL_NAME,
         **load_kwargs
     )
     
+    # FP8 веса (torchao, Ada/Hopper/Blackwell); vision encoder остаётся в bf16
+    if QUANTIZE == "fp8":
+        from torchao.quantization import quantize_, Float8WeightOnlyConfig
+        quantize_(
+            model,
+            Float8WeightOnlyConfig(),
+            # Сравнение по компоненту пути, как в llm_int8_skip_modules: в новых transformers
+            # vision tower вложен как model.visual.*
+            filter_fn=lambda module, fqn: isinstance(module, torch.nn.Linear) and "visual" not in fqn.split(".")
+        )
+    model.eval()
+    
+    # Статический KV-cache + CUDA Graph (reduce-overhead) для фазы декодирования;
+    # рассчитано на фиксированные формы входа. bitsandbytes INT8 с compile не работает
+    if USE_TORCH_COMPILE and QUANTIZE == "int8":
+        print("⚠️ torch.compile пропущен: не совместим с QUANTIZE=int8")
+    elif USE_TORCH_COMPILE and TORCH_VERSION >= (2, 4) and torch.cuda.is_available():
+        model.generation_config.cache_implementation = "static"
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+        torch_compiled = True
+
+
+def load_vllm_engine():
+    """Создание vLLM AsyncLLMEngine"""
+    global engine
+    
+    # bitsandbytes INT8 - только для transformers; в vLLM доступен fp8
+    if QUANTIZE == "int8":
+        raise ValueError("QUANTIZE=int8 не поддерживается с INFERENCE_BACKEND=vllm (используйте fp8 или none)")
+    
+    from vllm import AsyncLLMEngine
+    from vllm.engine.arg_utils import AsyncEngineArgs
+    
+    engine = AsyncLLMEngine.from_engine_args(AsyncEngineArgs(
+        model=MODEL_NAME,
+        dtype="bfloat16",
+        limit_mm_per_prompt={"image": 1},
+        mm_processor_kwargs={"min_pixels": MIN_PIXELS, "max_pixels": MAX_PIXELS},
+        quantization="fp8" if QUANTIZE == "fp8" else None,
+        # Общий префикс промптов (системное сообщение) не пересчитывается на prefill
+        enable_prefix_caching=ENABLE_PREFIX_CACHING,
+    ))
+
+
+def load_model():
+    """Загрузка модели при старте"""
+    global processor, device_info
+    
+    print(f"🚀 Loading model: {MODEL_NAME}")
+    print(f"   Backend: {INFERENCE_BACKEND}")
+    print(f"   Quantization: {QUANTIZE}")
+    print(f"   Flash Attention: {USE_FLASH_ATTENTION}")
+    print(f"   torch.compile: {USE_TORCH_COMPILE}")
+    print(f"   Max tokens: {MAX_NEW_TOKENS}")
+    
+    from transformers import AutoProcessor
+    
+    if INFERENCE_BACKEND == "vllm":
+        load_vllm_engine()
+    else:
+        load_hf_model()
+    
     # Загрузка процессора
     processor = AutoProcessor.from_pretrained(
         MODEL_NAME,
         min_pixels=MIN_PIXELS,
         max_pixels=MAX_PIXELS
     )
+    # Левый padding: в батче генерация продолжается с конца каждого промпта
+    processor.tokenizer.padding_side = "left"
+    for prompt in PROMPTS.values():
+        render_prompt(prompt)
     
     # Информация об устройстве
     if torch.cuda.is_available():
+        vram_free, vram_total = vram_gb()
         device_info = {
             "cuda_available": True,
-            "vram_total": torch.cuda.mem_get_info()[1] / 1024**3,
-            "vram_free": torch.cuda.mem_get_info()[0] / 1024**3,
+            "vram_total": vram_total,
+            "vram_free": vram_free,
             "cuda_version": torch.version.cuda,
         }
     else:
@@ -128,17 +280,204 @@ def load_model():
             "cuda_version": "N/A",
         }
     
+    if model is not None:
+        warmup()
+    
     print(f"✅ Model loaded! VRAM: {device_info.get('vram_free', 0):.1f}GB free")
 
 
+def warmup():
+    """Прогрев: автотюнинг ядер и компиляция torch.compile до первого запроса"""
+    from qwen_vl_utils import process_vision_info
+    
+    start_time = time.time()
+    image = Image.new("RGB", (1024, 1024), "white")
+    messages = [{"role": "user", "content": [
+        {"type": "image", "image": image},
+        {"type": "text", "text": PROMPTS["auto"]}
+    ]}]
+    image_inputs, _ = process_vision_info(messages)
+    generate_batch([PendingRequest(render_prompt(PROMPTS["auto"]), image_inputs, 8, None)])
+    print(f"🔥 Warmup done in {time.time() - start_time:.1f}s")
+
+
+@lru_cache(maxsize=32)
+def render_prompt(prompt: str) -> str:
+    """
+    Шаблон чата для сообщения "изображение + промпт"
+
+    Результат не зависит от самого изображения: плейсхолдер <|image_pad|>
+    раскрывается процессором при токенизации по размеру изображения.
+    """
+    messages = [{"role": "user", "content": [
+        {"type": "image"},
+        {"type": "text", "text": prompt}
+    ]}]
+    return processor.apply_chat_template(
+        messages,
+        tokenize=False,
+        add_generation_prompt=True
+    )
+
+
+def decode_image(image_data: bytes) -> Image.Image:
+    """Декодирование изображения: JPEG через libjpeg-turbo, остальное через PIL"""
+    if turbo_jpeg is not None and image_data[:3] == b"\xff\xd8\xff":
+        return Image.fromarray(turbo_jpeg.decode(image_data, pixel_format=TJPF_RGB))
+    return Image.open(io.BytesIO(image_data)).convert("RGB")
+
+
+def cap_image_pixels(image: Image.Image) -> Image.Image:
+    """Уменьшение изображения до MAX_PIXELS (меньше визуальных токенов на prefill)"""
+    ratio = min(1.0, math.sqrt(MAX_PIXELS / (image.width * image.height)))
+    if ratio >= 1.0:
+        return image
+    size = (max(1, int(image.width * ratio)), max(1, int(image.height * ratio)))
+    return image.resize(size, Image.BICUBIC)
+
+
+def move_to_device(inputs):
+    """
+    Копирование входов на GPU через pinned memory на отдельном CUDA stream
+
+    Копирование не блокирует поток и может перекрываться с декодированием
+    предыдущего батча; основной stream ждёт только завершения копии.
+    """
+    if copy_stream is None:
+        return inputs
+    with torch.cuda.stream(copy_stream):
+        for key, value in inputs.items():
+            if isinstance(value, torch.Tensor):
+                inputs[key] = value.pin_memory().to("cuda", non_blocking=True)
+    current_stream = torch.cuda.current_stream()
+    current_stream.wait_stream(copy_stream)
+    for value in inputs.values():
+        if isinstance(value, torch.Tensor):
+            value.record_stream(current_stream)
+    return inputs
+
+
+def generate_batch(batch: List[PendingRequest]) -> List[str]:
+    """Один вызов model.generate() для всех запросов батча"""
+    inputs = move_to_device(processor(
+        text=[item.text for item in batch],
+        images=[image for item in batch for image in item.images],
+        padding=True,
+        return_tensors="pt"
+    ))
+    
+    with generation_lock, torch.inference_mode():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max(item.max_tokens for item in batch),
+            do_sample=False
+        )
+    
+    # Промпты выровнены по левому краю - ответы начинаются с одной позиции
+    prompt_length = inputs.input_ids.shape[1]
+    return processor.batch_decode(
+        [outputs[i, prompt_length:prompt_length + item.max_tokens] for i, item in enumerate(batch)],
+        skip_special_tokens=True
+    )
+
+
+async def stream_vllm(text: str, images: list, max_tokens: int) -> AsyncIterator[str]:
+    """Генерация через vLLM с выдачей приращений текста (батчинг выполняет сам движок)"""
+    from vllm import SamplingParams
+    
+    sampling_params = SamplingParams(temperature=0, max_tokens=max_tokens)
+    sent = 0
+    async for output in engine.generate(
+        {"prompt": text, "multi_modal_data": {"image": images[0]}},
+        sampling_params,
+        request_id=uuid.uuid4().hex
+    ):
+        chunk = output.outputs[0].text[sent:]
+        sent += len(chunk)
+        if chunk:
+            yield chunk
+
+
+async def generate_vllm(text: str, images: list, max_tokens: int) -> str:
+    """Генерация через vLLM"""
+    return "".join([chunk async for chunk in stream_vllm(text, images, max_tokens)])
+
+
+def generate_streaming(text: str, images: list, max_tokens: int, streamer) -> None:
+    """model.generate() для одного запроса с выдачей текста через streamer"""
+    try:
+        inputs = move_to_device(processor(text=[text], images=images, return_tensors="pt"))
+        with generation_lock, torch.inference_mode():
+            model.generate(**inputs, max_new_tokens=max_tokens, do_sample=False, streamer=streamer)
+    except Exception:
+        streamer.end()  # Разблокировать читателя
+        raise
+
+
+async def stream_text(text: str, images: list, max_tokens: int) -> AsyncIterator[str]:
+    """Приращения текста по мере генерации (transformers или vLLM)"""
+    if engine is not None:
+        async for chunk in stream_vllm(text, images, max_tokens):
+            yield chunk
+        return
+    
+    from transformers import TextIteratorStreamer
+    
+    streamer = TextIteratorStreamer(processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    task = asyncio.create_task(asyncio.to_thread(generate_streaming, text, images, max_tokens, streamer))
+    while True:
+        chunk = await asyncio.to_thread(next, streamer, None)
+        if chunk is None:
+            break
+        if chunk:
+            yield chunk
+    await task
+
+
+async def batch_worker():
+    """Сбор запросов из очереди в батчи и их генерация"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await request_queue.get()]
+        deadline = loop.time() + BATCH_TIMEOUT_MS / 1000
+        while len(batch) < MAX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(request_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        start_time = time.time()
+        try:
+            results = await asyncio.to_thread(generate_batch, batch)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            continue
+        inference_time = time.time() - start_time
+        
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result((result, inference_time))
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle management"""
+    global model, engine, processor, request_queue, batcher_task
     load_model()
+    if engine is None:
+        request_queue = asyncio.Queue()
+        batcher_task = asyncio.create_task(batch_worker())
     yield
     # Cleanup
-    global model, processor
+    if batcher_task is not None:
+        batcher_task.cancel()
     del model
+    del engine
     del processor
     torch.cuda.empty_cache()
 
@@ -147,21 +486,21 @@ app = FastAPI(
     title="Qwen VLM OCR Service",
     description="VLM-based OCR service using Qwen2-VL models",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health():
     """Проверка состояния сервиса"""
-    if model is None:
+    if model is None and engine is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     vram_free = 0
     vram_total = 0
     if torch.cuda.is_available():
-        vram_free = torch.cuda.mem_get_info()[0] / 1024**3
-        vram_total = torch.cuda.mem_get_info()[1] / 1024**3
+        vram_free, vram_total = vram_gb(ttl=HEALTH_VRAM_TTL)
     
     return HealthResponse(
         status="healthy",
@@ -178,12 +517,43 @@ async def info():
     return InfoResponse(
         model=MODEL_NAME,
         max_tokens=MAX_NEW_TOKENS,
+        backend=INFERENCE_BACKEND,
+        quantization=QUANTIZE,
         flash_attention=USE_FLASH_ATTENTION,
+        torch_compile=torch_compiled,
         cuda_version=device_info.get("cuda_version", "N/A"),
         torch_version=torch.__version__
     )
 
 
+def prepare_request(request: OCRRequest) -> Tuple[str, list, int]:
+    """
+    Декодирование изображения и подготовка промпта
+    
+    Returns:
+        (текст шаблона чата, изображения для процессора, max_new_tokens)
+    """
+    from qwen_vl_utils import process_vision_info
+    
+    # Декодирование изображения
+    image_data = base64.b64decode(request.image)
+    image = cap_image_pixels(decode_image(image_data))
+    
+    # Выбор промпта
+    prompt = request.prompt or PROMPTS.get(request.language, PROMPTS["auto"])
+    
+    messages = [{"role": "user", "content": [
+        {"type": "image", "image": image},
+        {"type": "text", "text": prompt}
+    ]}]
+    
+    # Шаблон чата (из кэша по тексту промпта)
+    text = render_prompt(prompt)
+    image_inputs, _ = process_vision_info(messages)
+    
+    return text, image_inputs, request.max_tokens or MAX_NEW_TOKENS
+
+
 @app.post("/ocr", response_model=OCRResponse)
 async def ocr(request: OCRRequest):
     """
@@ -195,61 +565,27 @@ async def ocr(request: OCRRequest):
     Returns:
         OCRResponse с распознанным текстом
     """
-    if model is None or processor is None:
+    if (model is None and engine is None) or processor is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     try:
-        # Декодирование изображения
-        image_data = base64.b64decode(request.image)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        
-        # Выбор промпта
-        prompt = request.prompt or PROMPTS.get(request.language, PROMPTS["auto"])
-        
-        # Подготовка сообщения
-        from qwen_vl_utils import process_vision_info
-        
-        messages = [{"role": "user", "content": [
-            {"type": "image", "image": image},
-            {"type": "text", "text": prompt}
-        ]}]
+        text, image_inputs, max_tokens = prepare_request(request)
         
-        # Токенизация
-        text = processor.apply_chat_template(
-            messages, 
-            tokenize=False, 
-            add_generation_prompt=True
-        )
-        image_inputs, _ = process_vision_info(messages)
-        inputs = processor(
-            text=[text], 
-            images=image_inputs, 
-            padding=True, 
-            return_tensors="pt"
-        ).to("cuda" if torch.cuda.is_available() else "cpu")
-        
-        # Генерация
-        start_time = time.time()
-        
-        max_tokens = request.max_tokens or MAX_NEW_TOKENS
-        outputs = model.generate(
-            **inputs, 
-            max_new_tokens=max_tokens,
-            do_sample=False
-        )
-        
-        inference_time = time.time() - start_time
-        
-        # Декодирование
-        result = processor.batch_decode(
-            [outputs[0][len(inputs.input_ids[0]):]],
-            skip_special_tokens=True
-        )[0]
+        if engine is not None:
+            start_time = time.time()
+            result = await generate_vllm(text, image_inputs, max_tokens)
+            inference_time = time.time() - start_time
+        else:
+            # Генерация (в общем батче с параллельными запросами)
+            future = asyncio.get_running_loop().create_future()
+            await request_queue.put(PendingRequest(text, image_inputs, max_tokens, future))
+            result, inference_time = await future
         
         # VRAM использование
         vram_used = 0
         if torch.cuda.is_available():
-            vram_used = (torch.cuda.mem_get_info()[1] - torch.cuda.mem_get_info()[0]) / 1024**3
+            vram_free, vram_total = vram_gb()
+            vram_used = vram_total - vram_free
         
         return OCRResponse(
             text=result,
@@ -262,6 +598,36 @@ async def ocr(request: OCRRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/ocr/stream")
+async def ocr_stream(request: OCRRequest):
+    """
+    OCR изображения с потоковой выдачей
+    
+    Ответ - NDJSON: строки {"text": "..."} по мере генерации,
+    последняя строка {"done": true, "model": ..., "inference_time": ...}
+    """
+    if (model is None and engine is None) or processor is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        text, image_inputs, max_tokens = prepare_request(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def ndjson():
+        start_time = time.time()
+        async for chunk in stream_text(text, image_inputs, max_tokens):
+            yield orjson.dumps({"text": chunk}) + b"\n"
+        yield orjson.dumps({
+            "done": True,
+            "model": MODEL_NAME,
+            "inference_time": round(time.time() - start_time, 2)
+        }) + b"\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Один worker: модель занимает единственный GPU
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
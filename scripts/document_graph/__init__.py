@@ -10,6 +10,7 @@ from .document_structure import (
     normalize_text,
     filter_with_report,
     filter_garbage_headings,
+    iter_non_garbage_headings,
     analyze_document_structure,
 )
 
@@ -19,6 +20,7 @@ from .docx_parser import (
     extract_structure_docx,
     validate_docx_vs_pdf,
     find_docx_for_pdf,
+    build_docx_index,
     extract_doc_code,
 )
 
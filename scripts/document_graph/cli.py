@@ -27,7 +27,7 @@ def cmd_scan(args):
     print(f"📁 Сканирование: {input_path}")
     
     builder = DocumentGraphBuilder()
-    count = builder.scan_folder(input_path)
+    count = builder.scan_folder(input_path, jobs=args.jobs)
     
     print(f"📄 Найдено документов: {count}")
     
@@ -144,6 +144,8 @@ def main():
     scan_parser.add_argument('--output', '-o', required=True, help='Папка для результатов')
     scan_parser.add_argument('--format', '-f', choices=['json', 'html', 'all'], default='all',
                             help='Формат экспорта (default: all)')
+    scan_parser.add_argument('--jobs', '-j', type=int, default=1,
+                            help='Процессов для сканирования (0 = по числу CPU, default: 1)')
     
     # Команда test
     test_parser = subparsers.add_parser('test', help='Тестировать парсер документов')
@@ -7,10 +7,14 @@
 - Типы документов и их специфику
 """
 
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import List, Set, Dict, Optional
+from typing import Iterable, Iterator, List, Set, Dict, Optional
 from enum import Enum
+from functools import lru_cache
+from itertools import filterfalse
 import re
+import sys
 
 
 class DocumentType(Enum):
@@ -27,6 +31,20 @@ class DocumentType(Enum):
     UNKNOWN = "UNKNOWN"
 
 
+# Префикс кода документа -> тип
+_DOC_TYPE_MAP = {
+    "КД": DocumentType.KD,
+    "ДП": DocumentType.DP,
+    "ИОТ": DocumentType.IOT,
+    "РД": DocumentType.RD,
+    "РИ": DocumentType.RI,
+    "СТ": DocumentType.ST,
+    "РГ": DocumentType.RG,
+    "ПР": DocumentType.PR,
+    "TPM": DocumentType.TPM,
+}
+
+
 @dataclass
 class StandardSection:
     """Стандартный раздел документа"""
@@ -64,6 +82,17 @@ IOT_SECTIONS = [
 ]
 
 
+# Markdown якорь в конце заголовка: "Текст {#anchor}"
+_ANCHOR_RE = re.compile(r'\s*\{#[^}]+\}\s*$')
+
+
+def _strip_anchor(text: str) -> str:
+    """Убрать markdown якорь (без вызова regex, если якоря нет)"""
+    if '{#' not in text:
+        return text
+    return _ANCHOR_RE.sub('', text)
+
+
 # =============================================================================
 # МУСОРНЫЕ ПАТТЕРНЫ (колонтитулы, повторяющиеся элементы)
 # =============================================================================
@@ -200,6 +229,39 @@ IMPORTANT_PATTERNS = [
 ]
 
 
+# Скомпилированные один раз при импорте: все паттерны одной альтернацией -
+# один вызов search() вместо цикла по списку
+_GARBAGE_EXACT = frozenset(sys.intern(p.upper()) for p in GARBAGE_EXACT_PATTERNS)
+_GARBAGE_RE = re.compile(
+    "|".join(f"(?:{p})" for p in GARBAGE_REGEX_PATTERNS), re.IGNORECASE
+)
+_IMPORTANT_RE = re.compile(
+    "|".join(f"(?:{p})" for p in IMPORTANT_PATTERNS), re.IGNORECASE
+)
+
+
+def _is_garbage_fast(text: str,
+                     _sub=_ANCHOR_RE.sub,
+                     _exact=_GARBAGE_EXACT,
+                     _search=_GARBAGE_RE.search) -> bool:
+    """
+    Проверка на мусор одной функцией (горячий путь analyzer.is_garbage)
+    
+    Глобальные объекты привязаны как аргументы по умолчанию - внутри
+    функции это локальные переменные (LOAD_FAST вместо LOAD_GLOBAL/атрибутов)
+    """
+    if not text:
+        return True
+    if '{#' in text:
+        text = _sub('', text)
+    text = text.strip()
+    if len(text) < 3:
+        return True
+    if text.upper() in _exact:
+        return True
+    return _search(text) is not None
+
+
 class DocumentStructureAnalyzer:
     """
     Анализатор структуры документов
@@ -211,35 +273,18 @@ class DocumentStructureAnalyzer:
     """
     
     def __init__(self):
-        self._garbage_exact = {p.upper() for p in GARBAGE_EXACT_PATTERNS}
-        self._garbage_regex = [re.compile(p, re.IGNORECASE) for p in GARBAGE_REGEX_PATTERNS]
-        self._important_regex = [re.compile(p, re.IGNORECASE) for p in IMPORTANT_PATTERNS]
+        self._garbage_exact = _GARBAGE_EXACT
+        self._garbage_regex_combined = _GARBAGE_RE
+        self._important_regex_combined = _IMPORTANT_RE
     
     def get_document_type(self, doc_code: str) -> DocumentType:
         """Определить тип документа по коду"""
         if not doc_code:
             return DocumentType.UNKNOWN
-            
-        # Извлекаем префикс
-        parts = doc_code.split("-")
-        if not parts:
-            return DocumentType.UNKNOWN
-            
-        prefix = parts[0].upper()
         
-        type_map = {
-            "КД": DocumentType.KD,
-            "ДП": DocumentType.DP,
-            "ИОТ": DocumentType.IOT,
-            "РД": DocumentType.RD,
-            "РИ": DocumentType.RI,
-            "СТ": DocumentType.ST,
-            "РГ": DocumentType.RG,
-            "ПР": DocumentType.PR,
-            "TPM": DocumentType.TPM,
-        }
-        
-        return type_map.get(prefix, DocumentType.UNKNOWN)
+        # Префикс до первого дефиса
+        prefix, _, _ = doc_code.partition("-")
+        return _DOC_TYPE_MAP.get(prefix.upper(), DocumentType.UNKNOWN)
     
     def is_garbage(self, text: str) -> bool:
         """
@@ -251,26 +296,7 @@ class DocumentStructureAnalyzer:
         Returns:
             True если это мусор
         """
-        if not text:
-            return True
-            
-        # Очищаем от markdown якорей
-        clean_text = re.sub(r'\s*\{#[^}]+\}\s*$', '', text).strip()
-        
-        # Слишком короткий текст (обычно артефакт)
-        if len(clean_text) < 3:
-            return True
-        
-        # Точное совпадение
-        if clean_text.upper() in self._garbage_exact:
-            return True
-        
-        # Regex паттерны
-        for pattern in self._garbage_regex:
-            if pattern.search(clean_text):
-                return True
-        
-        return False
+        return _is_garbage_fast(text)
     
     def is_important(self, text: str) -> bool:
         """
@@ -285,13 +311,27 @@ class DocumentStructureAnalyzer:
         if not text:
             return False
             
-        clean_text = re.sub(r'\s*\{#[^}]+\}\s*$', '', text).strip()
+        clean_text = _strip_anchor(text).strip()
         
-        for pattern in self._important_regex:
-            if pattern.search(clean_text):
-                return True
+        return self._important_regex_combined.search(clean_text) is not None
+    
+    def _classify_one(self, clean_text: str) -> str:
+        """
+        Классифицировать текст, уже очищенный от markdown якоря
         
-        return False
+        Returns:
+            "blacklist" - точное совпадение с чёрным списком
+            "pattern" - совпадение с паттерном мусора
+            "important" - важный раздел
+            "content" - контент
+        """
+        if clean_text.upper() in self._garbage_exact:
+            return "blacklist"
+        if self._garbage_regex_combined.search(clean_text):
+            return "pattern"
+        if self._important_regex_combined.search(clean_text):
+            return "important"
+        return "content"
     
     def classify_heading(self, text: str) -> str:
         """
@@ -302,11 +342,17 @@ class DocumentStructureAnalyzer:
             "important" - важный раздел
             "content" - контент (нужно проверить)
         """
-        if self.is_garbage(text):
+        if not text:
             return "garbage"
-        if self.is_important(text):
-            return "important"
-        return "content"
+        
+        clean_text = _strip_anchor(text).strip()
+        if len(clean_text) < 3:
+            return "garbage"
+        
+        bucket = self._classify_one(clean_text)
+        if bucket in ("blacklist", "pattern"):
+            return "garbage"
+        return bucket
     
     def get_standard_sections(self, doc_type: DocumentType) -> List[StandardSection]:
         """Получить список стандартных разделов для типа документа"""
@@ -319,6 +365,19 @@ class DocumentStructureAnalyzer:
 analyzer = DocumentStructureAnalyzer()
 
 
+def iter_non_garbage_headings(headings: Iterable[str]) -> Iterator[str]:
+    """
+    Лениво отфильтровать мусорные заголовки (без промежуточного списка)
+    
+    Args:
+        headings: Заголовки (список или любой итератор)
+        
+    Returns:
+        Итератор по немусорным заголовкам
+    """
+    return filterfalse(_is_garbage_fast, headings)
+
+
 def filter_garbage_headings(headings: List[str]) -> List[str]:
     """
     Отфильтровать мусорные заголовки
@@ -329,7 +388,7 @@ def filter_garbage_headings(headings: List[str]) -> List[str]:
     Returns:
         Отфильтрованный список
     """
-    return [h for h in headings if not analyzer.is_garbage(h)]
+    return list(filterfalse(_is_garbage_fast, headings))
 
 
 def detect_headers_footers(pages_text: List[List[str]], threshold_percent: float = 50.0) -> Set[str]:
@@ -350,25 +409,21 @@ def detect_headers_footers(pages_text: List[List[str]], threshold_percent: float
     threshold = total_pages * (threshold_percent / 100.0)
     
     # Считаем на скольких страницах встречается каждый блок
-    from collections import defaultdict
-    text_page_count = defaultdict(int)
-    
+    # (множество на странице - чтобы не считать блок дважды)
+    text_page_count = Counter()
     for page_blocks in pages_text:
-        # Уникальные блоки на странице (чтобы не считать дважды)
-        seen_on_page = set()
-        for block in page_blocks:
-            normalized = normalize_text(block)
-            if normalized and normalized not in seen_on_page:
-                text_page_count[normalized] += 1
-                seen_on_page.add(normalized)
-    
-    # Фильтруем колонтитулы
-    garbage = {text for text, count in text_page_count.items() 
+        text_page_count.update({normalize_text(block) for block in page_blocks if block})
+    text_page_count.pop("", None)
+    
+    # Фильтруем колонтитулы (интернируем: одни и те же колонтитулы
+    # повторяются во всех документах корпуса)
+    garbage = {sys.intern(text) for text, count in text_page_count.items() 
                if count > threshold}
     
     return garbage
 
 
+@lru_cache(maxsize=8192)
 def normalize_text(text: str) -> str:
     """
     Нормализует текст для сравнения
@@ -381,15 +436,28 @@ def normalize_text(text: str) -> str:
         return ""
     
     # Убираем markdown якоря
-    clean = re.sub(r'\s*\{#[^}]+\}\s*$', '', text)
+    clean = _strip_anchor(text)
     # Убираем лишние пробелы
     clean = ' '.join(clean.split())
     # Нижний регистр
     clean = clean.lower().strip()
     
+    # Короткие строки (колонтитулы) интернируем - дедупликация между страницами
+    if len(clean) < 64:
+        clean = sys.intern(clean)
+    
     return clean
 
 
+# Категория analyzer._classify_one() -> ключ отчёта filter_with_report()
+_REPORT_BUCKETS = {
+    "blacklist": "filtered_by_blacklist",
+    "pattern": "filtered_by_pattern",
+    "important": "kept_important",
+    "content": "kept_content",
+}
+
+
 def filter_with_report(headings: List[str], repeat_garbage: Set[str] = None) -> Dict:
     """
     Фильтрует заголовки с детальным отчётом по каждому фильтру
@@ -406,8 +474,6 @@ def filter_with_report(headings: List[str], repeat_garbage: Set[str] = None) ->
         - kept_important: сохранено (важные разделы)
         - kept_content: сохранено (контент)
     """
-    from collections import Counter
-    
     repeat_garbage = repeat_garbage or set()
     
     result = {
@@ -420,38 +486,25 @@ def filter_with_report(headings: List[str], repeat_garbage: Set[str] = None) ->
     
     for heading in headings:
         normalized = normalize_text(heading)
-        clean_text = re.sub(r'\s*\{#[^}]+\}\s*$', '', heading).strip()
+        clean_text = _strip_anchor(heading).strip()
         
         # 1. Проверка на повторы (>50% страниц)
         if normalized in repeat_garbage:
             result["filtered_by_repeat"].append(heading)
             continue
         
-        # 2. Проверка на чёрный список (точные совпадения)
-        if clean_text.upper() in analyzer._garbage_exact:
-            result["filtered_by_blacklist"].append(heading)
-            continue
-        
-        # 3. Проверка на паттерны мусора (regex)
-        is_pattern_garbage = False
-        for pattern in analyzer._garbage_regex:
-            if pattern.search(clean_text):
-                result["filtered_by_pattern"].append(heading)
-                is_pattern_garbage = True
-                break
-        
-        if is_pattern_garbage:
-            continue
-        
-        # 4. Если прошёл все фильтры - классифицируем
-        if analyzer.is_important(heading):
-            result["kept_important"].append(heading)
-        else:
-            result["kept_content"].append(heading)
+        # 2-4. Чёрный список (точные совпадения), паттерны мусора (regex),
+        # важные разделы / контент
+        bucket = analyzer._classify_one(clean_text)
+        result[_REPORT_BUCKETS[bucket]].append(heading)
     
     return result
 
 
+# Заголовок первого уровня: "# Текст" (пустой текст тоже считается заголовком)
+_H1_RE = re.compile(r'^# (.*)$', re.MULTILINE)
+
+
 def analyze_document_structure(md_content: str) -> Dict:
     """
     Анализировать структуру документа
@@ -462,8 +515,6 @@ def analyze_document_structure(md_content: str) -> Dict:
     Returns:
         Статистика по структуре
     """
-    lines = md_content.split('\n')
-    
     stats = {
         "total_headings": 0,
         "garbage_headings": 0,
@@ -473,25 +524,25 @@ def analyze_document_structure(md_content: str) -> Dict:
         "important_examples": [],
     }
     
-    for line in lines:
-        if line.startswith('# '):
-            heading = line[2:].strip()
-            stats["total_headings"] += 1
-            
-            classification = analyzer.classify_heading(heading)
-            
-            if classification == "garbage":
-                stats["garbage_headings"] += 1
-                if len(stats["garbage_examples"]) < 5:
-                    stats["garbage_examples"].append(heading)
-                    
-            elif classification == "important":
-                stats["important_headings"] += 1
-                if len(stats["important_examples"]) < 5:
-                    stats["important_examples"].append(heading)
-                    
-            else:
-                stats["content_headings"] += 1
+    # Только строки-заголовки, остальные строки в Python-объекты не попадают
+    for match in _H1_RE.finditer(md_content):
+        heading = match.group(1).strip()
+        stats["total_headings"] += 1
+        
+        classification = analyzer.classify_heading(heading)
+        
+        if classification == "garbage":
+            stats["garbage_headings"] += 1
+            if len(stats["garbage_examples"]) < 5:
+                stats["garbage_examples"].append(heading)
+                
+        elif classification == "important":
+            stats["important_headings"] += 1
+            if len(stats["important_examples"]) < 5:
+                stats["important_examples"].append(heading)
+                
+        else:
+            stats["content_headings"] += 1
     
     return stats
 
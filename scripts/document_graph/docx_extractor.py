@@ -3,10 +3,26 @@
 Более точный источник для названий и структурированных данных
 """
 
+import hashlib
+import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, List
-from dataclasses import dataclass, field
+from typing import AbstractSet, Optional, Dict, List, Set
+from dataclasses import asdict, dataclass, field
+
+try:
+    from docx import Document
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 
 @dataclass
@@ -41,9 +57,88 @@ FIELD_KEYWORDS = {
 }
 
 
+def _build_keyword_automaton():
+    """Автомат Ахо-Корасик: ключевое слово -> имя поля (один проход по ячейке)"""
+    automaton = ahocorasick.Automaton()
+    pairs = [(kw, 'title') for kw in TITLE_KEYWORDS]
+    pairs += [(kw, name) for name, kws in FIELD_KEYWORDS.items() for kw in kws]
+    for kw, name in pairs:
+        # Одно ключевое слово может относиться к нескольким полям
+        names = automaton.get(kw, ())
+        automaton.add_word(kw, names + (name,))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton() if AHOCORASICK_AVAILABLE else None
+
+# Поле -> альтернация его ключевых слов (fallback без автомата)
+_FIELD_RES = {
+    name: re.compile('|'.join(map(re.escape, kws)))
+    for name, kws in [('title', TITLE_KEYWORDS), *FIELD_KEYWORDS.items()]
+}
+
+
+def _scan_key_fields(key_text: str) -> Set[str]:
+    """Подстрочный поиск ключевых слов в тексте ключа"""
+    if _KEYWORD_AUTOMATON is not None:
+        return {name for _, names in _KEYWORD_AUTOMATON.iter(key_text) for name in names}
+    
+    # Fallback без pyahocorasick: одна альтернация на поле
+    return {name for name, regex in _FIELD_RES.items() if regex.search(key_text)}
+
+
+# Обратный индекс: ключ, совпадающий с ключевым словом целиком -> поля.
+# Значения посчитаны тем же подстрочным поиском, поэтому результат идентичен
+KEY_TO_FIELDS = {
+    kw: frozenset(_scan_key_fields(kw))
+    for kw in [*TITLE_KEYWORDS, *(kw for kws in FIELD_KEYWORDS.values() for kw in kws)]
+}
+
+
+def match_key_fields(key_text: str) -> AbstractSet[str]:
+    """
+    Определить, к каким полям метаданных относится ключ таблицы
+    
+    Args:
+        key_text: Текст ячейки-ключа в нижнем регистре
+        
+    Returns:
+        Множество имён полей ('title', 'doc_number', ...)
+    """
+    # Типичная таблица метаданных: ключ - ровно ключевое слово ("Разработчик:")
+    fields = KEY_TO_FIELDS.get(key_text.strip().rstrip(':').rstrip())
+    if fields is not None:
+        return fields
+    
+    return _scan_key_fields(key_text)
+
+
+# Дисковый кэш метаданных: повторные запуски не разбирают неизменённые DOCX.
+# Пустое значение DOCX_META_CACHE_DIR отключает кэш.
+DOCX_META_CACHE_DIR = os.getenv("DOCX_META_CACHE_DIR", str(Path.home() / ".cache" / "docx_meta"))
+# Увеличивать при изменении логики извлечения - старые записи станут невалидны.
+# Таблицы ключевых слов входят в версию автоматически (отпечаток их содержимого)
+_CACHE_VERSION = "1:" + hashlib.sha1(
+    json.dumps([TITLE_KEYWORDS, FIELD_KEYWORDS], ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()[:12]
+
+
+def _cache_path(docx_path: Path) -> Optional[Path]:
+    """Файл кэша для DOCX: ключ - путь, mtime и размер файла"""
+    if not DOCX_META_CACHE_DIR:
+        return None
+    try:
+        stat = os.stat(docx_path)
+    except OSError:
+        return None
+    key = f"{_CACHE_VERSION}|{Path(docx_path).resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return Path(DOCX_META_CACHE_DIR) / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+
 def extract_from_docx(docx_path: Path) -> DocxMetadata:
     """
-    Извлечь метаданные из DOCX файла
+    Извлечь метаданные из DOCX файла (с дисковым кэшем)
     
     Стратегия поиска:
     1. Ищем таблицу со структурой "Ключ | Значение" (обычно Таблица 1)
@@ -51,22 +146,52 @@ def extract_from_docx(docx_path: Path) -> DocxMetadata:
     2. Если не найдено - ищем в таблице на титульной странице
     3. Проверяем свойства документа
     """
-    try:
-        from docx import Document
-    except ImportError:
+    if not DOCX_AVAILABLE:
         return DocxMetadata()
     
+    cache_file = _cache_path(docx_path)
+    if cache_file is not None:
+        try:
+            return DocxMetadata(**json.loads(cache_file.read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            pass
+    
+    metadata = _extract_from_docx(docx_path)
+    if metadata is None:
+        # DOCX не открылся (заблокирован, не докачан) - не кэшируем, иначе
+        # пустой результат останется до изменения mtime файла
+        return DocxMetadata()
+    
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # Запись через временный файл: пул процессов пишет параллельно
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps(asdict(metadata), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+    
+    return metadata
+
+
+def _extract_from_docx(docx_path: Path) -> Optional[DocxMetadata]:
+    """Разбор DOCX без кэша (см. extract_from_docx); None - файл не открылся"""
     metadata = DocxMetadata()
     
     try:
         doc = Document(docx_path)
-    except Exception as e:
-        return DocxMetadata()
+    except Exception:
+        return None
     
     # 1. Ищем таблицу с метаданными (структура "Ключ | Значение")
+    # Очищенные ключи: шапки вида "Наименование" повторяются между таблицами
+    key_cache: Dict[str, str] = {}
+    
     for table in doc.tables[:10]:  # Проверяем первые 10 таблиц
         # Проверяем, похожа ли таблица на таблицу метаданных (2-3 столбца)
-        if len(table.columns) < 2 or len(table.columns) > 4:
+        columns_count = len(table.columns)
+        if columns_count < 2 or columns_count > 4:
             continue
         
         for row in table.rows:
@@ -75,41 +200,56 @@ def extract_from_docx(docx_path: Path) -> DocxMetadata:
                 continue
             
             # Берём первую и вторую ячейку как ключ-значение
-            key_text = clean_text(cells[0].text).lower()
-            value_text = clean_text(cells[1].text)
+            key_raw = cells[0].text
+            key_text = key_cache.get(key_raw)
+            if key_text is None:
+                key_text = key_cache[key_raw] = clean_text(key_raw).lower()
             
             # Пропускаем пустые строки
-            if not key_text or not value_text:
+            if not key_text:
                 continue
             
-            # Пропускаем если значение слишком короткое
+            # Ключ не относится ни к одному полю - значение не читаем
+            fields = match_key_fields(key_text)
+            if not fields:
+                continue
+            
+            value_text = clean_text(cells[1].text)
+            
+            # Пропускаем пустые значения и слишком короткие
             if len(value_text) < 5:
                 continue
             
             # Название документа
-            if any(kw in key_text for kw in TITLE_KEYWORDS):
+            if 'title' in fields:
                 if len(value_text) > 10 and not metadata.title:
                     metadata.title = value_text
             
             # Номер документа
-            if any(kw in key_text for kw in FIELD_KEYWORDS['doc_number']):
+            if 'doc_number' in fields:
                 if not metadata.doc_number:
                     metadata.doc_number = value_text
             
             # Тип документа
-            if any(kw in key_text for kw in FIELD_KEYWORDS['doc_type']):
+            if 'doc_type' in fields:
                 if not metadata.doc_type:
                     metadata.doc_type = value_text
             
             # Подразделение
-            if any(kw in key_text for kw in FIELD_KEYWORDS['department']):
+            if 'department' in fields:
                 if not metadata.department:
                     metadata.department = value_text
             
             # Разработчик
-            if any(kw in key_text for kw in FIELD_KEYWORDS['developer']):
+            if 'developer' in fields:
                 if not metadata.developer:
                     metadata.developer = value_text
+            
+            # Все поля таблицы заполнены - остальные строки и таблицы не нужны
+            # (шаги 2 и 3 работают только при отсутствии названия)
+            if (metadata.title and metadata.doc_number and metadata.doc_type
+                    and metadata.department and metadata.developer):
+                return metadata
     
     # 2. Если название не найдено, пробуем таблицу титульной страницы
     if not metadata.title and doc.tables:
@@ -124,6 +264,16 @@ def extract_from_docx(docx_path: Path) -> DocxMetadata:
     return metadata
 
 
+# Служебные поля титульной страницы - не кандидаты в название
+_TITLE_SKIP_RE = re.compile('|'.join(map(re.escape, [
+    'дата введения', 'effective date',
+    'утвержден', 'approved',
+    'система менеджмента', 'quality management',
+    'версия', 'version', 'revision',
+    'страница', 'page',
+])), re.IGNORECASE)
+
+
 def extract_title_from_title_page(table) -> Optional[str]:
     """
     Извлечь название с титульной страницы (первая таблица)
@@ -138,22 +288,13 @@ def extract_title_from_title_page(table) -> Optional[str]:
             text = clean_text(cell.text)
             
             # Пропускаем служебные поля
-            skip_patterns = [
-                'дата введения', 'effective date',
-                'утвержден', 'approved',
-                'система менеджмента', 'quality management',
-                'версия', 'version', 'revision',
-                'страница', 'page',
-            ]
-            
-            text_lower = text.lower()
-            if any(pat in text_lower for pat in skip_patterns):
+            if _TITLE_SKIP_RE.search(text):
                 continue
             
             # Кандидат должен быть достаточно длинным
             if len(text) > 20 and len(text) < 200:
                 # Не должен содержать много цифр (это не номер)
-                digit_ratio = sum(c.isdigit() for c in text) / len(text)
+                digit_ratio = sum(map(str.isdigit, text)) / len(text)
                 if digit_ratio < 0.3:
                     candidates.append(text)
     
@@ -164,19 +305,25 @@ def extract_title_from_title_page(table) -> Optional[str]:
     return None
 
 
+# Регулярки clean_text (вызывается на каждую ячейку таблицы)
+_WS_RE = re.compile(r'\s+')
+_UNDERSCORE_RE = re.compile(r'_+')
+_NEWLINE_TABLE = str.maketrans({'\n': ' ', '\r': ' '})
+
+
 def clean_text(text: str) -> str:
     """Очистка текста от лишних символов"""
     if not text:
         return ""
     
-    # Убираем переносы строк
-    text = text.replace('\n', ' ').replace('\r', ' ')
+    # Убираем переносы строк (один проход translate вместо двух replace)
+    text = text.translate(_NEWLINE_TABLE)
     
     # Убираем множественные пробелы
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     
     # Убираем подчеркивания (часто используются как линии)
-    text = re.sub(r'_+', '', text)
+    text = _UNDERSCORE_RE.sub('', text)
     
     # Убираем начальные/конечные пробелы
     text = text.strip()
@@ -214,17 +361,24 @@ def find_docx_for_pdf(pdf_path: Path, docx_base_path: Path = None) -> Optional[P
     return None
 
 
-def batch_extract_docx_metadata(pdf_paths: List[Path], docx_base_path: Path = None) -> Dict[str, DocxMetadata]:
+def batch_extract_docx_metadata(pdf_paths: List[Path], docx_base_path: Path = None,
+                                jobs: int = 0) -> Dict[str, DocxMetadata]:
     """
     Пакетное извлечение метаданных из DOCX для списка PDF
     
+    Args:
+        pdf_paths: Список PDF файлов
+        docx_base_path: Папка с DOCX (по умолчанию - рядом с pdf)
+        jobs: Количество процессов (1 - последовательно, 0 - по числу CPU)
+    
     Returns:
         Dict[doc_code -> DocxMetadata]
     """
     from .parser import parse_document_code
     
-    results = {}
-    
+    # Сначала сопоставляем PDF и DOCX, затем разбираем DOCX (CPU-bound)
+    codes = []
+    docx_paths = []
     for pdf_path in pdf_paths:
         # Получаем код документа
         doc = parse_document_code(pdf_path.parent.name if pdf_path.parent.name != 'pdf' else pdf_path.name)
@@ -234,10 +388,17 @@ def batch_extract_docx_metadata(pdf_paths: List[Path], docx_base_path: Path = No
         # Ищем соответствующий docx
         docx_path = find_docx_for_pdf(pdf_path, docx_base_path)
         if docx_path:
-            metadata = extract_from_docx(docx_path)
-            results[doc.code] = metadata
+            codes.append(doc.code)
+            docx_paths.append(docx_path)
+    
+    if jobs == 1 or len(docx_paths) < 2:
+        metadata_list = map(extract_from_docx, docx_paths)
+        return dict(zip(codes, metadata_list))
     
-    return results
+    # map() сохраняет порядок: при повторе кода побеждает последний, как раньше
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        metadata_list = executor.map(extract_from_docx, docx_paths)
+        return dict(zip(codes, metadata_list))
 
 
 if __name__ == "__main__":
@@ -8,12 +8,17 @@ DOCX Parser - извлечение структуры из Word документ
 """
 
 import re
+import zipfile
+from xml.etree import ElementTree
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
+from typing import FrozenSet, List, Optional, Tuple, Dict
 from dataclasses import dataclass
 
 try:
     from docx import Document
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml.ns import qn
     DOCX_AVAILABLE = True
 except ImportError:
     DOCX_AVAILABLE = False
@@ -24,6 +29,12 @@ try:
 except ImportError:
     FITZ_AVAILABLE = False
 
+# RE2 (google-re2): линейный DFA-поиск кода документа по большим текстам
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
 
 @dataclass
 class Heading:
@@ -50,13 +61,16 @@ class ValidationResult:
     docx_doc_code: str = ""
 
 
-# Regex для извлечения кода документа
-DOC_CODE_PATTERN = re.compile(
-    r'(КД|ДП|РД|РИ|СТ|РГ|ИОТ|TPM|ПР)-[А-ЯA-Z0-9\.\-]+',
-    re.IGNORECASE
+# Regex для извлечения кода документа (флаг inline - совместим с re и re2)
+DOC_CODE_PATTERN = _re_engine.compile(
+    r'(?i)(КД|ДП|РД|РИ|СТ|РГ|ИОТ|TPM|ПР)-[А-ЯA-Z0-9\.\-]+'
 )
 
 
+# Пространство имён WordprocessingML для разбора document.xml
+_W_NS = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+
+
 def extract_doc_code(text: str) -> Optional[str]:
     """Извлечь код документа из текста"""
     if not text:
@@ -81,13 +95,26 @@ def extract_structure_docx(docx_path: str) -> List[Heading]:
     doc = Document(docx_path)
     headings = []
     
-    for p in doc.paragraphs:
-        if p.style and 'Heading' in p.style.name:
+    # Имена стилей разрешаем один раз: style_id -> имя ("Heading 1").
+    # Проверять нужно имя, а не w:val - в локализованных документах id бывает "1"
+    style_names = {
+        style.style_id: style.name
+        for style in doc.styles
+        if style.type == WD_STYLE_TYPE.PARAGRAPH
+    }
+    default_style = doc.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+    default_name = default_style.name if default_style is not None else None
+    
+    # Обходим <w:p> напрямую: обёртка Paragraph и поиск стиля на каждый абзац не нужны
+    for p in doc.element.body.iterchildren(qn('w:p')):
+        style_id = p.style
+        style_name = style_names.get(style_id, default_name) if style_id else default_name
+        if style_name and 'Heading' in style_name:
             text = p.text.strip()
             if text:  # Пропускаем пустые заголовки
                 # Извлекаем уровень из названия стиля
                 try:
-                    level = int(p.style.name.replace('Heading ', '').replace('Heading', '1'))
+                    level = int(style_name.replace('Heading ', '').replace('Heading', '1'))
                 except ValueError:
                     level = 1
                 headings.append(Heading(text=text, level=level))
@@ -95,16 +122,12 @@ def extract_structure_docx(docx_path: str) -> List[Heading]:
     return headings
 
 
-def get_docx_last_content(docx_path: str) -> str:
-    """Получить текст последних параграфов DOCX"""
-    if not DOCX_AVAILABLE:
-        return ""
-    
-    doc = Document(docx_path)
-    
-    # Собираем текст последних непустых параграфов
+def _docx_last_content(doc) -> str:
+    """Текст последних параграфов уже открытого DOCX"""
+    # Собираем текст последних непустых параграфов: идём по <w:p> с конца,
+    # не создавая обёртки Paragraph для всего документа
     last_texts = []
-    for p in reversed(doc.paragraphs):
+    for p in doc.element.body.iterchildren(qn('w:p'), reversed=True):
         text = p.text.strip()
         if text:
             last_texts.insert(0, text)
@@ -114,16 +137,11 @@ def get_docx_last_content(docx_path: str) -> str:
     return ' '.join(last_texts)
 
 
-def get_docx_first_content(docx_path: str) -> str:
-    """Получить текст первых параграфов DOCX"""
-    if not DOCX_AVAILABLE:
-        return ""
-    
-    doc = Document(docx_path)
-    
-    # Собираем текст первых непустых параграфов
+def _docx_first_content(doc) -> str:
+    """Текст первых параграфов уже открытого DOCX"""
+    # Собираем текст первых непустых параграфов (лениво, до 5 штук)
     first_texts = []
-    for p in doc.paragraphs:
+    for p in doc.element.body.iterchildren(qn('w:p')):
         text = p.text.strip()
         if text:
             first_texts.append(text)
@@ -133,29 +151,50 @@ def get_docx_first_content(docx_path: str) -> str:
     return ' '.join(first_texts)
 
 
+def get_docx_last_content(docx_path: str) -> str:
+    """Получить текст последних параграфов DOCX"""
+    if not DOCX_AVAILABLE:
+        return ""
+    
+    return _docx_last_content(Document(docx_path))
+
+
+def get_docx_first_content(docx_path: str) -> str:
+    """Получить текст первых параграфов DOCX"""
+    if not DOCX_AVAILABLE:
+        return ""
+    
+    return _docx_first_content(Document(docx_path))
+
+
 def estimate_docx_pages(docx_path: str) -> int:
     """
     Оценить количество страниц в DOCX
     
-    Точный подсчёт без Word невозможен, используем эвристику
+    Точный подсчёт без Word невозможен, используем эвристику.
+    Читаем word/document.xml напрямую из zip - объектная модель
+    python-docx для подсчёта не нужна.
     """
-    if not DOCX_AVAILABLE:
+    try:
+        with zipfile.ZipFile(docx_path) as archive:
+            xml = archive.read('word/document.xml')
+        body = ElementTree.fromstring(xml).find('w:body', _W_NS)
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return 0
+    if body is None:
         return 0
-    
-    doc = Document(docx_path)
     
     # Способ 1: По количеству секций (если есть page breaks)
-    section_count = len(doc.sections)
+    section_count = (len(body.findall('./w:p/w:pPr/w:sectPr', _W_NS))
+                     + len(body.findall('./w:sectPr', _W_NS)))
     
-    # Способ 2: Считаем page breaks в документе
-    page_breaks = 0
-    for p in doc.paragraphs:
-        for run in p.runs:
-            if run._element.xml and 'w:br' in run._element.xml and 'w:type="page"' in run._element.xml:
-                page_breaks += 1
+    # Способ 2: Считаем page breaks в документе (только абзацы верхнего
+    # уровня - таблицы не учитываются, как и раньше)
+    page_breaks = len(body.findall("./w:p//w:br[@w:type='page']", _W_NS))
     
-    # Способ 3: Эвристика по объёму текста (~3000 символов на страницу)
-    total_chars = sum(len(p.text) for p in doc.paragraphs)
+    # Способ 3: Эвристика по объёму текста (~3000 символов на страницу);
+    # ElementTree отдаёт текст уже без XML-экранирования
+    total_chars = sum(len(t.text or '') for t in body.iterfind('./w:p//w:t', _W_NS))
     estimated_by_chars = max(1, total_chars // 3000)
     
     # Берём максимум из оценок
@@ -178,7 +217,7 @@ def get_pdf_first_page_text(pdf_path: str) -> str:
     
     with fitz.open(pdf_path) as doc:
         if doc.page_count > 0:
-            return doc[0].get_text()
+            return doc[0].get_text("text")
     return ""
 
 
@@ -189,10 +228,32 @@ def get_pdf_last_page_text(pdf_path: str) -> str:
     
     with fitz.open(pdf_path) as doc:
         if doc.page_count > 0:
-            return doc[-1].get_text()
+            return doc[-1].get_text("text")
     return ""
 
 
+def _pdf_snapshot(pdf_path: str) -> Tuple[int, str, str]:
+    """
+    Количество страниц и текст первой/последней страницы PDF за одно открытие
+    
+    Returns:
+        (page_count, first_page_text, last_page_text)
+    """
+    if not FITZ_AVAILABLE:
+        return 0, "", ""
+    
+    with fitz.open(pdf_path) as doc:
+        if doc.page_count == 0:
+            return 0, "", ""
+        return doc.page_count, doc[0].get_text("text"), doc[-1].get_text("text")
+
+
+@lru_cache(maxsize=128)
+def _word_set(text: str) -> FrozenSet[str]:
+    """Множество слов текста в нижнем регистре (кэш: сниппеты повторяются)"""
+    return frozenset(text.lower().split())
+
+
 def text_similarity(text1: str, text2: str) -> float:
     """
     Простая мера похожести текстов
@@ -202,16 +263,17 @@ def text_similarity(text1: str, text2: str) -> float:
     if not text1 or not text2:
         return 0.0
     
-    words1 = set(text1.lower().split())
-    words2 = set(text2.lower().split())
-    
-    if not words1 or not words2:
+    words1 = _word_set(text1)
+    if not words1:
         return 0.0
     
-    intersection = words1 & words2
-    union = words1 | words2
+    words2 = _word_set(text2)
+    if not words2:
+        return 0.0
     
-    return len(intersection) / len(union) if union else 0.0
+    # |A ∪ B| = |A| + |B| - |A ∩ B| - множество объединения не строим
+    intersection = len(words1 & words2)
+    return intersection / (len(words1) + len(words2) - intersection)
 
 
 def validate_docx_vs_pdf(docx_path: str, pdf_path: str) -> ValidationResult:
@@ -232,17 +294,23 @@ def validate_docx_vs_pdf(docx_path: str, pdf_path: str) -> ValidationResult:
     """
     details = []
     
-    # 1. Количество страниц
-    pdf_pages = get_pdf_pages(pdf_path)
+    # Каждый файл открываем один раз (распаковка zip + разбор XML DOCX -
+    # самая дорогая часть проверки)
+    pdf_pages, pdf_first, pdf_last = _pdf_snapshot(pdf_path)
+    
     docx_pages = estimate_docx_pages(docx_path)
+    docx_first, docx_last = "", ""
+    if DOCX_AVAILABLE:
+        doc = Document(docx_path)
+        docx_first = _docx_first_content(doc)
+        docx_last = _docx_last_content(doc)
+    
+    # 1. Количество страниц
     pages_match = abs(pdf_pages - docx_pages) <= 1
     
     details.append(f"Страницы: PDF={pdf_pages}, DOCX≈{docx_pages}, {'OK' if pages_match else 'MISMATCH'}")
     
     # 2. Код документа
-    pdf_first = get_pdf_first_page_text(pdf_path)
-    docx_first = get_docx_first_content(docx_path)
-    
     pdf_doc_code = extract_doc_code(pdf_first) or ""
     docx_doc_code = extract_doc_code(docx_first) or ""
     
@@ -255,9 +323,6 @@ def validate_docx_vs_pdf(docx_path: str, pdf_path: str) -> ValidationResult:
     details.append(f"Код: PDF='{pdf_doc_code}', DOCX='{docx_doc_code}', {'OK' if doc_code_match else 'MISMATCH'}")
     
     # 3. Контент последней страницы
-    pdf_last = get_pdf_last_page_text(pdf_path)
-    docx_last = get_docx_last_content(docx_path)
-    
     # Берём начало и конец для сравнения
     pdf_snippet = (pdf_last[:100] + pdf_last[-100:]) if len(pdf_last) > 200 else pdf_last
     docx_snippet = (docx_last[:100] + docx_last[-100:]) if len(docx_last) > 200 else docx_last
@@ -283,7 +348,28 @@ def validate_docx_vs_pdf(docx_path: str, pdf_path: str) -> ValidationResult:
     )
 
 
-def find_docx_for_pdf(pdf_path: str, docx_base_dir: str = None) -> Optional[str]:
+def build_docx_index(docx_base_dir: str) -> Dict[str, str]:
+    """
+    Один обход директории с DOCX для пакетного поиска
+    
+    Args:
+        docx_base_dir: Базовая директория для поиска DOCX
+        
+    Returns:
+        Dict[имя файла без расширения в верхнем регистре -> путь] в порядке обхода
+    """
+    base = Path(docx_base_dir)
+    if not base.exists():
+        return {}
+    
+    index: Dict[str, str] = {}
+    for docx_file in base.rglob('*.docx'):
+        index.setdefault(docx_file.stem.upper(), str(docx_file))
+    return index
+
+
+def find_docx_for_pdf(pdf_path: str, docx_base_dir: str = None,
+                      docx_index: Dict[str, str] = None) -> Optional[str]:
     """
     Найти DOCX файл, соответствующий PDF
     
@@ -295,6 +381,7 @@ def find_docx_for_pdf(pdf_path: str, docx_base_dir: str = None) -> Optional[str]
     Args:
         pdf_path: Путь к PDF
         docx_base_dir: Базовая директория для поиска DOCX
+        docx_index: Готовый индекс build_docx_index (для пакетной обработки)
         
     Returns:
         Путь к DOCX или None
@@ -322,13 +409,14 @@ def find_docx_for_pdf(pdf_path: str, docx_base_dir: str = None) -> Optional[str]
     if same_dir_docx.exists():
         return str(same_dir_docx)
     
-    # Способ 3: Поиск по базовой директории
-    if docx_base_dir:
-        base = Path(docx_base_dir)
-        if base.exists() and doc_code:
-            for docx_file in base.rglob('*.docx'):
-                if doc_code.upper() in docx_file.stem.upper():
-                    return str(docx_file)
+    # Способ 3: Поиск по базовой директории (по индексу, без повторного обхода)
+    if doc_code and (docx_index is not None or docx_base_dir):
+        if docx_index is None:
+            docx_index = build_docx_index(docx_base_dir)
+        code = doc_code.upper()
+        for stem, docx_file in docx_index.items():
+            if code in stem:
+                return docx_file
     
     return None
 
@@ -3,11 +3,21 @@
 Экспорт результатов тестирования гибридного парсера в структурированный формат
 """
 
+import os
+import re
 import sys
 import shutil
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
@@ -19,7 +29,271 @@ from scripts.document_graph.hierarchy_builder import export_tree_json
 from scripts.document_graph.test_hybrid_parser import find_test_documents
 
 
-def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
+# Код документа: первый токен имени файла без круглых скобок
+_FIRST_TOKEN_RE = re.compile(r"\S+")
+_PAREN_TABLE = str.maketrans("", "", "()")
+
+
+def _doc_code_from_stem(stem: str) -> str:
+    """Код документа из имени файла: '(КД-ДП-М1.046-02) Положение' -> 'КД-ДП-М1.046-02'"""
+    m = _FIRST_TOKEN_RE.search(stem)
+    return m.group().translate(_PAREN_TABLE) if m else ""
+
+
+def _write_json(path: Path, data) -> None:
+    """Записать JSON с отступом 2 (orjson - C-сериализация сразу в UTF-8 байты)"""
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _headings_payload(headings):
+    """
+    Заголовки для parse_result.json в форме [{"text": ..., "level": ...}]
+    
+    orjson сериализует dataclass Heading нативно в тот же словарь, поэтому
+    промежуточные dict не создаются; для json - явный список словарей.
+    """
+    if ORJSON_AVAILABLE:
+        return headings
+    return [{"text": h.text, "level": h.level} for h in headings]
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """
+    Разместить файл-источник в папке результата без копирования данных
+    
+    Жёсткая ссылка (та же ФС) -> символическая ссылка (другое устройство)
+    -> полное копирование, если ссылки не поддерживаются
+    """
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        dst.symlink_to(Path(src).resolve())
+        return
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+
+
+def _sync_source(src: Path, dst: Path) -> None:
+    """
+    Обновить файл-источник в папке результата, только если он изменился
+    
+    Совпадение размера и mtime_ns считается признаком той же версии файла
+    (жёсткая ссылка, симлинк и copy2 сохраняют оба значения). Устаревшая
+    копия или битая ссылка заменяются.
+    """
+    src_st = os.stat(src)
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        dst_st = None
+    
+    if dst_st is not None and (dst_st.st_size, dst_st.st_mtime_ns) == (src_st.st_size, src_st.st_mtime_ns):
+        return
+    
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    _link_or_copy(src, dst)
+
+
+def _render_tree(root, limit: int = 200) -> Tuple[List[str], int]:
+    """
+    Markdown-список узлов дерева (обход в глубину явным стеком)
+    
+    Форматируются только первые limit строк, остальные узлы лишь считаются
+    
+    Returns:
+        (строки, общее количество узлов без корня)
+    """
+    lines = []
+    total = 0
+    stack = [(root, 0)]
+    while stack:
+        node, indent = stack.pop()
+        if node.id != "root":
+            total += 1
+            if total <= limit:
+                prefix = "  " * indent
+                marker = "📌" if node.is_actionable else "📄"
+                num_part = f"**{node.num}** " if node.num else ""
+                title_short = node.title[:60] + "..." if len(node.title) > 60 else node.title
+                lines.append(f"{prefix}- {marker} {num_part}{title_short}")
+        # Лимит на children; reversed - чтобы первый ребёнок был снят со стека первым
+        stack.extend((child, indent + 1) for child in reversed(node.children[:50]))
+    return lines, total
+
+
+def _process_one(i: int, pdf_path: Path, doc_code: str, docx_base: str,
+                 results_dir: Path) -> Tuple[int, Dict, str]:
+    """
+    Обработать один документ (выполняется в процессе пула)
+    
+    Парсинг, запись результатов в results/NN_CODE/ и форматирование отчёта
+    
+    Returns:
+        (i, doc_stats, report) - report пустой при ошибке
+    """
+    prefix = f"{i:02d}_{doc_code}"
+    
+    try:
+        result = parse_document(str(pdf_path), docx_base)
+        
+        # 3. Создаём папку для результатов
+        result_dir = results_dir / prefix
+        result_dir.mkdir(exist_ok=True)
+        
+        # 3.1 Исходный PDF в папке результата (ссылка, копия - только если иначе нельзя)
+        local_pdf = result_dir / f"source.pdf"
+        _sync_source(pdf_path, local_pdf)
+        
+        # 3.2 DOCX если есть
+        if result.docx_path:
+            docx_src = Path(result.docx_path)
+            if docx_src.exists():
+                local_docx = result_dir / f"source.docx"
+                _sync_source(docx_src, local_docx)
+        
+        # 4. Сохраняем JSON с результатом
+        result_json = {
+            "doc_code": result.doc_code,
+            "source": result.source,
+            "headings_count": len(result.headings),
+            "headings": _headings_payload(result.headings),
+            "pdf_path": str(pdf_path),
+            "docx_path": result.docx_path or None,
+            "validation": {
+                "is_valid": result.validation.is_valid if result.validation else None,
+                "details": result.validation.details if result.validation else None,
+            } if result.validation else None,
+            "filter_report": result.filter_report,
+        }
+        
+        _write_json(result_dir / "parse_result.json", result_json)
+        
+        # 4.1 Сохраняем иерархическую структуру
+        if result.structure_tree:
+            export_tree_json(result.structure_tree, result_dir / "structure_tree.json")
+        
+        # 5. Сохраняем текстовый отчёт
+        report = format_parse_report(result)
+        with open(result_dir / "report.txt", "w", encoding="utf-8") as f:
+            f.write(report)
+        
+        # 6. Сохраняем MD с результатом парсинга (контент документа)
+        md_lines = [
+            f"# {result.doc_code or doc_code}",
+            "",
+            f"**Источник:** {result.source.upper()}",
+            f"**Заголовков:** {len(result.headings)}",
+            "",
+        ]
+        
+        if result.validation:
+            md_lines.extend([
+                "## Валидация DOCX",
+                "",
+                f"- Результат: {'✅ Актуален' if result.validation.is_valid else '❌ Не актуален'}",
+                f"- Детали: {result.validation.details}",
+                "",
+            ])
+        
+        if result.filter_report:
+            fr = result.filter_report
+            md_lines.extend([
+                "## Фильтрация",
+                "",
+                f"| Метрика | Значение |",
+                f"|---------|----------|",
+                f"| Блоков до | {fr.get('total_blocks', 0)} |",
+                f"| Блоков после | {fr.get('after_filtering', 0)} |",
+                f"| По повторам | {len(fr.get('by_repeat', []))} |",
+                f"| По blacklist | {len(fr.get('by_blacklist', []))} |",
+                f"| По паттернам | {len(fr.get('by_pattern', []))} |",
+                "",
+            ])
+        
+        # Иерархическая структура
+        if result.structure_tree:
+            tree = result.structure_tree
+            md_lines.extend([
+                "## Иерархическая структура",
+                "",
+                f"| Метрика | Значение |",
+                f"|---------|----------|",
+                f"| Разделов | {tree.total_sections} |",
+                f"| Макс. глубина | {tree.max_depth} |",
+                f"| Actionable | {tree.actionable_sections} |",
+                f"| RACI статус | {tree.raci_status} |",
+                "",
+                "### Дерево документа",
+                "",
+            ])
+            
+            tree_lines, total_nodes = _render_tree(tree.root, limit=200)
+            md_lines.extend(tree_lines)  # Лимит на общее количество
+            
+            if total_nodes > 200:
+                md_lines.append(f"\n*... и ещё {total_nodes - 200} узлов*")
+        else:
+            # Fallback: плоский список если нет дерева
+            md_lines.extend([
+                "## Структура документа",
+                "",
+            ])
+            
+            if result.filter_report and result.filter_report.get("kept_important"):
+                md_lines.append("### Важные разделы")
+                md_lines.append("")
+                for h in result.filter_report["kept_important"][:20]:
+                    md_lines.append(f"- {h}")
+                md_lines.append("")
+            
+            md_lines.append("### Заголовки")
+            md_lines.append("")
+            for h in result.headings[:50]:
+                prefix = "#" * min(h.level, 4)
+                md_lines.append(f"{prefix} {h.text}")
+                md_lines.append("")
+            
+            if len(result.headings) > 50:
+                md_lines.append(f"*... и ещё {len(result.headings) - 50} заголовков*")
+        
+        # Построчная запись через буфер файла, без склейки всего MD в одну строку
+        with open(result_dir / "structure.md", "w", encoding="utf-8") as f:
+            f.writelines(f"{line}\n" for line in md_lines)
+        
+        # 7. Статистика документа (свёртка - в основном процессе)
+        doc_stats = {
+            "code": result.doc_code or doc_code,
+            "source": result.source,
+            "headings": len(result.headings),
+        }
+        
+        if result.source != "docx" and result.filter_report:
+            fr = result.filter_report
+            doc_stats["filtered"] = {
+                "total": fr.get("total_blocks", 0),
+                "kept": fr.get("after_filtering", 0),
+                "by_repeat": len(fr.get("by_repeat", [])),
+                "by_blacklist": len(fr.get("by_blacklist", [])),
+                "by_pattern": len(fr.get("by_pattern", [])),
+            }
+        
+        return i, doc_stats, report
+        
+    except Exception as e:
+        return i, {"code": doc_code, "error": str(e)}, ""
+
+
+def export_test_results(base_dir: Path, output_dir: Path, count: int = 8, jobs: int = 0):
     """
     Экспортировать результаты тестов в структурированном виде
     
@@ -38,6 +312,11 @@ def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
     └── README.md          # Описание структуры
     """
     
+    # Единая отметка времени для statistics.json, summary.txt и README.md
+    now = datetime.now()
+    now_iso = now.isoformat()
+    now_human = now.strftime('%Y-%m-%d %H:%M:%S')
+    
     # Создаём директории
     sources_dir = output_dir / "sources"
     results_dir = output_dir / "results"
@@ -64,7 +343,7 @@ def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
     
     # Статистика
     stats = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": now_iso,
         "total_documents": len(test_docs),
         "docx_used": 0,
         "pdf_used": 0,
@@ -78,211 +357,68 @@ def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
         "documents": []
     }
     
-    all_reports = []
+    # Симлинки на источники создаём в основном процессе (это быстро),
+    # парсинг и запись результатов - в пуле процессов
+    # Имена, уже лежащие в sources/ (включая битые симлинки) - один проход
+    # scandir вместо stat на каждый документ
+    with os.scandir(sources_dir) as it:
+        existing_sources = {entry.name for entry in it}
     
-    # Обрабатываем каждый документ
+    tasks = []
     for i, pdf_path in enumerate(test_docs, 1):
-        doc_code = pdf_path.stem.split()[0].replace("(", "").replace(")", "")
+        doc_code = _doc_code_from_stem(pdf_path.stem)
         prefix = f"{i:02d}_{doc_code}"
         
-        print(f"\n[{i}/{len(test_docs)}] {doc_code}...")
-        
         # 1. Создаём симлинк на источник
-        source_link = sources_dir / f"{prefix}.pdf"
-        if source_link.exists():
-            source_link.unlink()
-        source_link.symlink_to(pdf_path.resolve())
+        link_name = f"{prefix}.pdf"
+        link_path = os.path.join(sources_dir, link_name)
+        if link_name in existing_sources:
+            os.unlink(link_path)
+        os.symlink(os.path.abspath(pdf_path), link_path)
         
-        # 2. Парсим документ
-        try:
-            result = parse_document(str(pdf_path), docx_base)
-            
-            # 3. Создаём папку для результатов
-            result_dir = results_dir / prefix
-            result_dir.mkdir(exist_ok=True)
-            
-            # 3.1 Копируем исходный PDF в папку результата
-            local_pdf = result_dir / f"source.pdf"
-            if not local_pdf.exists():
-                shutil.copy2(pdf_path, local_pdf)
-            
-            # 3.2 Копируем DOCX если есть
-            if result.docx_path:
-                docx_src = Path(result.docx_path)
-                if docx_src.exists():
-                    local_docx = result_dir / f"source.docx"
-                    if not local_docx.exists():
-                        shutil.copy2(docx_src, local_docx)
-            
-            # 4. Сохраняем JSON с результатом
-            result_json = {
-                "doc_code": result.doc_code,
-                "source": result.source,
-                "headings_count": len(result.headings),
-                "headings": [{"text": h.text, "level": h.level} for h in result.headings],
-                "pdf_path": str(pdf_path),
-                "docx_path": result.docx_path or None,
-                "validation": {
-                    "is_valid": result.validation.is_valid if result.validation else None,
-                    "details": result.validation.details if result.validation else None,
-                } if result.validation else None,
-                "filter_report": result.filter_report,
-            }
-            
-            with open(result_dir / "parse_result.json", "w", encoding="utf-8") as f:
-                json.dump(result_json, f, ensure_ascii=False, indent=2)
-            
-            # 4.1 Сохраняем иерархическую структуру
-            if result.structure_tree:
-                export_tree_json(result.structure_tree, result_dir / "structure_tree.json")
-            
-            # 5. Сохраняем текстовый отчёт
-            report = format_parse_report(result)
-            with open(result_dir / "report.txt", "w", encoding="utf-8") as f:
-                f.write(report)
-            
-            all_reports.append(report)
-            
-            # 6. Сохраняем MD с результатом парсинга (контент документа)
-            md_lines = [
-                f"# {result.doc_code or doc_code}",
-                "",
-                f"**Источник:** {result.source.upper()}",
-                f"**Заголовков:** {len(result.headings)}",
-                "",
-            ]
-            
-            if result.validation:
-                md_lines.extend([
-                    "## Валидация DOCX",
-                    "",
-                    f"- Результат: {'✅ Актуален' if result.validation.is_valid else '❌ Не актуален'}",
-                    f"- Детали: {result.validation.details}",
-                    "",
-                ])
-            
-            if result.filter_report:
-                fr = result.filter_report
-                md_lines.extend([
-                    "## Фильтрация",
-                    "",
-                    f"| Метрика | Значение |",
-                    f"|---------|----------|",
-                    f"| Блоков до | {fr.get('total_blocks', 0)} |",
-                    f"| Блоков после | {fr.get('after_filtering', 0)} |",
-                    f"| По повторам | {len(fr.get('by_repeat', []))} |",
-                    f"| По blacklist | {len(fr.get('by_blacklist', []))} |",
-                    f"| По паттернам | {len(fr.get('by_pattern', []))} |",
-                    "",
-                ])
-            
-            # Иерархическая структура
-            if result.structure_tree:
-                tree = result.structure_tree
-                md_lines.extend([
-                    "## Иерархическая структура",
-                    "",
-                    f"| Метрика | Значение |",
-                    f"|---------|----------|",
-                    f"| Разделов | {tree.total_sections} |",
-                    f"| Макс. глубина | {tree.max_depth} |",
-                    f"| Actionable | {tree.actionable_sections} |",
-                    f"| RACI статус | {tree.raci_status} |",
-                    "",
-                    "### Дерево документа",
-                    "",
-                ])
-                
-                # Рекурсивный вывод дерева
-                def render_tree(node, indent=0):
-                    lines = []
-                    if node.id != "root":
-                        prefix = "  " * indent
-                        marker = "📌" if node.is_actionable else "📄"
-                        num_part = f"**{node.num}** " if node.num else ""
-                        title_short = node.title[:60] + "..." if len(node.title) > 60 else node.title
-                        lines.append(f"{prefix}- {marker} {num_part}{title_short}")
-                    for child in node.children[:50]:  # Лимит на children
-                        lines.extend(render_tree(child, indent + 1))
-                    return lines
-                
-                tree_lines = render_tree(tree.root)
-                md_lines.extend(tree_lines[:200])  # Лимит на общее количество
-                
-                if len(tree_lines) > 200:
-                    md_lines.append(f"\n*... и ещё {len(tree_lines) - 200} узлов*")
-            else:
-                # Fallback: плоский список если нет дерева
-                md_lines.extend([
-                    "## Структура документа",
-                    "",
-                ])
-                
-                if result.filter_report and result.filter_report.get("kept_important"):
-                    md_lines.append("### Важные разделы")
-                    md_lines.append("")
-                    for h in result.filter_report["kept_important"][:20]:
-                        md_lines.append(f"- {h}")
-                    md_lines.append("")
-                
-                md_lines.append("### Заголовки")
-                md_lines.append("")
-                for h in result.headings[:50]:
-                    prefix = "#" * min(h.level, 4)
-                    md_lines.append(f"{prefix} {h.text}")
-                    md_lines.append("")
-                
-                if len(result.headings) > 50:
-                    md_lines.append(f"*... и ещё {len(result.headings) - 50} заголовков*")
-            
-            with open(result_dir / "structure.md", "w", encoding="utf-8") as f:
-                f.write("\n".join(md_lines))
-            
-            # 7. Обновляем статистику
-            doc_stats = {
-                "code": result.doc_code or doc_code,
-                "source": result.source,
-                "headings": len(result.headings),
-            }
+        tasks.append((i, pdf_path, doc_code))
+    
+    # Результаты собираем по индексу: порядок документов в отчётах сохраняется
+    doc_results: List[Optional[Tuple[Dict, str]]] = [None] * len(tasks)
+    
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        futures = [
+            executor.submit(_process_one, i, pdf_path, doc_code, docx_base, results_dir)
+            for i, pdf_path, doc_code in tasks
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            i, doc_stats, report = future.result()
+            doc_results[i - 1] = (doc_stats, report)
             
-            if result.source == "docx":
-                stats["docx_used"] += 1
+            if "error" in doc_stats:
+                print(f"[{done}/{len(tasks)}] {doc_stats['code']}: ❌ Ошибка: {doc_stats['error']}")
             else:
-                stats["pdf_used"] += 1
-                
-                if result.filter_report:
-                    fr = result.filter_report
-                    stats["filter_stats"]["total_blocks"] += fr.get("total_blocks", 0)
-                    stats["filter_stats"]["after_filtering"] += fr.get("after_filtering", 0)
-                    stats["filter_stats"]["by_repeat"] += len(fr.get("by_repeat", []))
-                    stats["filter_stats"]["by_blacklist"] += len(fr.get("by_blacklist", []))
-                    stats["filter_stats"]["by_pattern"] += len(fr.get("by_pattern", []))
-                    
-                    doc_stats["filtered"] = {
-                        "total": fr.get("total_blocks", 0),
-                        "kept": fr.get("after_filtering", 0),
-                        "by_repeat": len(fr.get("by_repeat", [])),
-                        "by_blacklist": len(fr.get("by_blacklist", [])),
-                        "by_pattern": len(fr.get("by_pattern", [])),
-                    }
-            
-            stats["documents"].append(doc_stats)
-            
-            print(f"   ✅ {result.source.upper()}: {len(result.headings)} заголовков")
+                print(f"[{done}/{len(tasks)}] {doc_stats['code']}: ✅ {doc_stats['source'].upper()}: {doc_stats['headings']} заголовков")
+    
+    # Свёртка статистики после завершения пула (без общих изменяемых данных)
+    for doc_stats, report in doc_results:
+        stats["documents"].append(doc_stats)
+        if "error" in doc_stats:
+            continue
+        
+        if doc_stats["source"] == "docx":
+            stats["docx_used"] += 1
+        else:
+            stats["pdf_used"] += 1
             
-        except Exception as e:
-            print(f"   ❌ Ошибка: {e}")
-            stats["documents"].append({
-                "code": doc_code,
-                "error": str(e),
-            })
+            filtered = doc_stats.get("filtered")
+            if filtered:
+                stats["filter_stats"]["total_blocks"] += filtered["total"]
+                stats["filter_stats"]["after_filtering"] += filtered["kept"]
+                stats["filter_stats"]["by_repeat"] += filtered["by_repeat"]
+                stats["filter_stats"]["by_blacklist"] += filtered["by_blacklist"]
+                stats["filter_stats"]["by_pattern"] += filtered["by_pattern"]
     
     # Сохраняем сводные отчёты
     print("\n📊 Сохранение сводных отчётов...")
     
     # 1. statistics.json
-    with open(reports_dir / "statistics.json", "w", encoding="utf-8") as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
+    _write_json(reports_dir / "statistics.json", stats)
     
     # 2. summary.txt
     summary_lines = [
@@ -290,7 +426,7 @@ def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
         "   СВОДНЫЙ ОТЧЁТ ПО ТЕСТИРОВАНИЮ ГИБРИДНОГО ПАРСЕРА",
         "=" * 70,
         "",
-        f"Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Дата: {now_human}",
         f"Источник: {base_dir}",
         "",
         "=" * 70,
@@ -334,17 +470,17 @@ def export_test_results(base_dir: Path, output_dir: Path, count: int = 8):
         "",
     ])
     
-    for report in all_reports:
-        summary_lines.append(report)
-        summary_lines.append("\n")
-    
-    with open(reports_dir / "summary.txt", "w", encoding="utf-8") as f:
-        f.write("\n".join(summary_lines))
+    # Детальные отчёты пишем по одному, без склейки всех отчётов в одну строку
+    with open(reports_dir / "summary.txt", "w", encoding="utf-8") as summary_file:
+        summary_file.write("\n".join(summary_lines))
+        for doc_stats, report in doc_results:
+            if "error" not in doc_stats:
+                summary_file.write(f"\n{report}\n\n")
     
     # 3. README.md
-    readme = f"""# Результаты тестирования гибридного парсера
+    readme_parts = [f"""# Результаты тестирования гибридного парсера
 
-**Дата:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Дата:** {now_human}
 
 ## Структура
 
@@ -353,8 +489,8 @@ output3/hybrid_parser_test/
 ├── sources/           # Символические ссылки на исходные PDF файлы
 ├── results/           # Детальные результаты по каждому документу
 │   └── NN_DOC-CODE/
-│       ├── source.pdf          # Копия исходного PDF (для сравнения)
-│       ├── source.docx         # Копия DOCX если есть (для сравнения)
+│       ├── source.pdf          # Исходный PDF: жёсткая ссылка или копия (для сравнения)
+│       ├── source.docx         # DOCX если есть: жёсткая ссылка или копия (для сравнения)
 │       ├── parse_result.json   # Структурированный результат парсинга
 │       ├── report.txt          # Текстовый отчёт о фильтрации
 │       └── structure.md        # Структура документа в Markdown
@@ -385,16 +521,16 @@ output3/hybrid_parser_test/
 
 | # | Код | Источник | Заголовков |
 |---|-----|----------|------------|
-"""
+"""]
     
     for i, doc in enumerate(stats["documents"], 1):
         if "error" in doc:
-            readme += f"| {i} | {doc['code']} | ❌ ОШИБКА | - |\n"
+            readme_parts.append(f"| {i} | {doc['code']} | ❌ ОШИБКА | - |\n")
         else:
-            readme += f"| {i} | {doc['code']} | {doc['source'].upper()} | {doc['headings']} |\n"
+            readme_parts.append(f"| {i} | {doc['code']} | {doc['source'].upper()} | {doc['headings']} |\n")
     
     with open(output_dir / "README.md", "w", encoding="utf-8") as f:
-        f.write(readme)
+        f.write("".join(readme_parts))
     
     print(f"\n✅ Экспорт завершён: {output_dir}")
     print(f"   📁 sources/: {len(test_docs)} файлов")
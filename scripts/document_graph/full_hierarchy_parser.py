@@ -12,9 +12,13 @@
 import sys
 import json
 import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 
 # Добавляем путь к модулям
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -40,6 +44,36 @@ try:
 except ImportError:
     PDFPLUMBER_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import fitz  # PyMuPDF
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+# Страница "с полным нативным текстом": не меньше стольких символов текста
+# и ни одно изображение не занимает заметную долю страницы (не скан)
+TEXT_RICH_MIN_CHARS = 200
+TEXT_RICH_MAX_IMAGE_RATIO = 0.25
+
+# Буфер записи выходных MD (много мелких write() сливаются в крупные)
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _write_json(path: Path, data) -> None:
+    """Записать JSON с отступом 2 (orjson - C-сериализация сразу в UTF-8 байты)"""
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
 
 @dataclass
 class FullParseResult:
@@ -49,141 +83,210 @@ class FullParseResult:
     full_markdown: str  # Полный текст документа
     tree: DocumentTree  # Иерархия с контентом
     stats: Dict
+    cleaned_markdown: str = ""  # full_markdown после clean_markdown (считается один раз)
 
 
-def clean_markdown(markdown: str) -> str:
+# Паттерны мусорных строк (проверяются через re.match, IGNORECASE)
+_GARBAGE_PATTERNS = [
+    # Колонтитулы
+    r'^Дата введения изменения.*Стр\.\s*\d+\s*из\s*\d+',
+    r'^Стр\.\s*\d+\s*из\s*\d+',
+    r'^Дата введения изменения',
+    r'^Основание:?',
+    r'^#\s+.*ДП-[А-Яа-я0-9.-]+\s*\{#',  # Название документа в колонтитуле
+    r'^#\s+[А-Яа-я\s]+\s+ДП-[А-Яа-я0-9.-]+\s*\{#',
+    
+    # Мусор от титульных страниц (векторная графика с битой кодировкой)
+    r'^#{1,6}\s*TIYBIII',  # "ПУБЛИЧНОЕ" с битой кодировкой
+    r'^#{1,6}\s*AKUI4OHEP',  # "АКЦИОНЕРНОЕ" с битой кодировкой
+    r'^#{1,6}\s*YTBEPx',  # "УТВЕРЖДЕНА" с битой кодировкой
+    r'^#{1,6}\s*CI4CTEMA',  # "СИСТЕМА" с битой кодировкой
+    r'^#{1,6}\s*AII-\d',  # "ДП-" с битой кодировкой
+    r'^#{1,6}\s*<<An\s*u',  # "Авиакомпания" с битой кодировкой
+    r'^#{1,6}\s*flara',  # "Дата" с битой кодировкой
+    r'^#{1,6}\s*lpr4Ka3oM',  # "приказом" с битой кодировкой
+    r'^#{1,6}\s*reHepanbHofo',  # "генерального" с битой кодировкой
+    r'^#{1,6}\s*Ar\{peKTopa',  # "директора" с битой кодировкой
+    r'^#{1,6}\s*rlaprepnbre',  # "Чартерные" с битой кодировкой
+    r'^#{1,6}\s*peficrr',  # "рейсы" с битой кодировкой
+    r'^#{1,6}\s*Xanrsr-M',  # "Ханты-Мансийск" с битой кодировкой
+    r'^#{1,6}\s*OEIUECTB',  # "ОБЩЕСТВО" с битой кодировкой
+    r'^r\.\s*X[a-z]',  # "г. Ханты..." с битой кодировкой
+    r'TIYBIII',  # В любом месте строки
+    r'AKUI4OHEP',
+    r'OEIUECTB\s*O',
+    
+    # OCR мусор из схем и таблиц
+    r'^#\s+(НЕ\s+ВЫПОЛ|ДА\s+НЕТ|ДЕЙСТВИЙ|ПРОДАЖА|Необходимость|ПРИМЕЧАН|РЕАЛИЗАЦИЯ|КОМПОНОВКА|ТИП\s+ВС|ДАТА/ВРЕМЯ|МАРШРУТ)',
+    r'^#\s+ТЕХНИЧЕСКИЙ\s+ДИРЕКТОРАТ',
+    
+    # OCR артефакты (смешанная латиница/кириллица - признак битой кодировки)
+    r'^[A-Z]{3,}[а-яА-Я]',  # Латиница потом кириллица
+    r'^[а-яА-Я]+[A-Z]{3,}',  # Кириллица потом латиница (если не email)
+    
+    # Короткие бессмысленные строки
+    r'^#?\s*[а-яА-Я]{1,3}$',  # 1-3 буквы
+    r'^#?\s*[нных|ых|х|№]+$',  # Обрезки от таблиц
+    r'^#?\s*ние$',  # "Изменение" обрезанное
+    r'^#?\s*Измене$',
+    
+    # Email в заголовке
+    r'^#\s+[а-яА-Я\w.]+@',
+    
+    # Телефоны как заголовки
+    r'^#?\s*\(\d+\)\s*\d+',
+]
+
+# Все мусорные паттерны одной альтернацией: одна проверка на строку вместо цикла
+_GARBAGE_RE = re.compile("|".join(f"(?:{p})" for p in _GARBAGE_PATTERNS), re.IGNORECASE)
+
+# Заголовок (markdown или нумерованный пункт) - конец раздела "Лист регистрации"
+_HEADING_RE = re.compile(r'^(?:#{1,6}\s+|\d+(?:\.\d+)*\s+)', re.IGNORECASE)
+_CHANGELOG_RE = re.compile(r'лист регистрации внесения изменений', re.IGNORECASE)
+
+# Нормальные латинские вставки: коды документов, email, авиационные термины
+_DOC_WHITELIST_RE = re.compile(
+    r'(ДП-|РК|СТО|КД-|РД-|ИОТ-|'
+    r'ISO|IATA|ICAO|DCS|PNL|MVT|LDM|APIS|'
+    r'EASA|FAA|MEL|CDL|SB|AD|AMP|MRB|RVSM|ETOPS|'
+    r'MMEL|MPD|CMM|IPC|AMM|TSM|FIM|WDM|SRM|'
+    r'AMOS|SAP|ERP|CRM|SMS|QMS|EFB|OCC|AOC|'
+    r'NOTAM|SIGMET|METAR|TAF|RVR|ILS|VOR|NDB|DME|'
+    r'PIC|SIC|FE|LAE|TRE|TRI|SFI|SFE|'
+    r'Boeing|Airbus|ATR|Bombardier|Embraer|'
+    r'B737|B767|A320|CRJ|DHC|'
+    r'UTC|GMT|MSK|'
+    r'@|http|www\.)'
+)
+
+# Префильтр эвристики битой кодировки: без латиницы строка заведомо не мусор,
+# search останавливается на первой латинской букве
+_LATIN_RE = re.compile(r'[a-zA-Z]')
+
+# Подсчёт латиницы/кириллицы за один проход: translate сводит [a-zA-Z] к 'a',
+# [а-яА-ЯёЁ] к 'я', затем str.count (без findall и промежуточных списков)
+_LATIN_LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_CYRILLIC_LETTERS = "абвгдежзийклмнопрстуфхцчшщъыьэюяАБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯёЁ"
+_ALPHA_FOLD_TABLE = str.maketrans(
+    _LATIN_LETTERS + _CYRILLIC_LETTERS,
+    "a" * len(_LATIN_LETTERS) + "я" * len(_CYRILLIC_LETTERS),
+)
+
+
+def _iter_lines(text: str) -> Iterator[str]:
     """
-    Очистка markdown от мусора.
+    Строки text по '\n' (как text.split('\n')), без списка всех строк
     
-    Удаляет:
-    - Колонтитулы (Дата введения... Стр. X из Y)
-    - Повторяющиеся названия документа в колонтитулах
-    - Мусор от титульных страниц (векторная графика с битой кодировкой)
-    - OCR мусор из схем и таблиц
-    - Пустые строки подряд
+    В памяти одновременно только текущая строка - важно для OCR-выводов
+    в десятки МБ, где split() порождает миллионы мелких str.
+    """
+    start = 0
+    find = text.find
+    while True:
+        end = find('\n', start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def _iter_clean_lines(markdown: str) -> Iterator[str]:
+    """
+    Построчная очистка markdown от мусора (генератор).
+    
+    Общий проход для clean_markdown и assign_markdown_to_tree: фильтрация
+    мусора и схлопывание пустых строк за один обход без промежуточных списков.
     """
-    lines = markdown.split('\n')
-    cleaned = []
     skip_change_log = False
-    heading_pattern = r'^(?:#{1,6}\s+|\d+(?:\.\d+)*\s+)'
-    change_log_pattern = r'лист регистрации внесения изменений'
-    
-    # Паттерны для удаления
-    garbage_patterns = [
-        # Колонтитулы
-        r'^Дата введения изменения.*Стр\.\s*\d+\s*из\s*\d+',
-        r'^Стр\.\s*\d+\s*из\s*\d+',
-        r'^Дата введения изменения',
-        r'^Основание:?',
-        r'^#\s+.*ДП-[А-Яа-я0-9.-]+\s*\{#',  # Название документа в колонтитуле
-        r'^#\s+[А-Яа-я\s]+\s+ДП-[А-Яа-я0-9.-]+\s*\{#',
-        
-        # Мусор от титульных страниц (векторная графика с битой кодировкой)
-        r'^#{1,6}\s*TIYBIII',  # "ПУБЛИЧНОЕ" с битой кодировкой
-        r'^#{1,6}\s*AKUI4OHEP',  # "АКЦИОНЕРНОЕ" с битой кодировкой
-        r'^#{1,6}\s*YTBEPx',  # "УТВЕРЖДЕНА" с битой кодировкой
-        r'^#{1,6}\s*CI4CTEMA',  # "СИСТЕМА" с битой кодировкой
-        r'^#{1,6}\s*AII-\d',  # "ДП-" с битой кодировкой
-        r'^#{1,6}\s*<<An\s*u',  # "Авиакомпания" с битой кодировкой
-        r'^#{1,6}\s*flara',  # "Дата" с битой кодировкой
-        r'^#{1,6}\s*lpr4Ka3oM',  # "приказом" с битой кодировкой
-        r'^#{1,6}\s*reHepanbHofo',  # "генерального" с битой кодировкой
-        r'^#{1,6}\s*Ar\{peKTopa',  # "директора" с битой кодировкой
-        r'^#{1,6}\s*rlaprepnbre',  # "Чартерные" с битой кодировкой
-        r'^#{1,6}\s*peficrr',  # "рейсы" с битой кодировкой
-        r'^#{1,6}\s*Xanrsr-M',  # "Ханты-Мансийск" с битой кодировкой
-        r'^#{1,6}\s*OEIUECTB',  # "ОБЩЕСТВО" с битой кодировкой
-        r'^r\.\s*X[a-z]',  # "г. Ханты..." с битой кодировкой
-        r'TIYBIII',  # В любом месте строки
-        r'AKUI4OHEP',
-        r'OEIUECTB\s*O',
-        
-        # OCR мусор из схем и таблиц
-        r'^#\s+(НЕ\s+ВЫПОЛ|ДА\s+НЕТ|ДЕЙСТВИЙ|ПРОДАЖА|Необходимость|ПРИМЕЧАН|РЕАЛИЗАЦИЯ|КОМПОНОВКА|ТИП\s+ВС|ДАТА/ВРЕМЯ|МАРШРУТ)',
-        r'^#\s+ТЕХНИЧЕСКИЙ\s+ДИРЕКТОРАТ',
-        
-        # OCR артефакты (смешанная латиница/кириллица - признак битой кодировки)
-        r'^[A-Z]{3,}[а-яА-Я]',  # Латиница потом кириллица
-        r'^[а-яА-Я]+[A-Z]{3,}',  # Кириллица потом латиница (если не email)
-        
-        # Короткие бессмысленные строки
-        r'^#?\s*[а-яА-Я]{1,3}$',  # 1-3 буквы
-        r'^#?\s*[нных|ых|х|№]+$',  # Обрезки от таблиц
-        r'^#?\s*ние$',  # "Изменение" обрезанное
-        r'^#?\s*Измене$',
-        
-        # Email в заголовке
-        r'^#\s+[а-яА-Я\w.]+@',
-        
-        # Телефоны как заголовки
-        r'^#?\s*\(\d+\)\s*\d+',
-    ]
+    prev_empty = False
     
-    for line in lines:
+    for line in _iter_lines(markdown):
         skip = False
         line_stripped = line.strip()
         
         # Пропускаем весь раздел "ЛИСТ РЕГИСТРАЦИИ ВНЕСЕНИЯ ИЗМЕНЕНИЙ"
         if skip_change_log:
-            if re.match(heading_pattern, line_stripped, re.IGNORECASE):
+            if _HEADING_RE.match(line_stripped):
                 skip_change_log = False
             else:
                 continue
         
-        if re.search(change_log_pattern, line_stripped, re.IGNORECASE):
+        if _CHANGELOG_RE.search(line_stripped):
             skip_change_log = True
             continue
         
         # Проверка по паттернам
-        for pattern in garbage_patterns:
-            if re.match(pattern, line_stripped, re.IGNORECASE):
-                skip = True
-                break
+        if _GARBAGE_RE.match(line_stripped):
+            skip = True
         
         # Дополнительная проверка: строки с высоким % нестандартной латиницы
-        if not skip and line_stripped:
+        # (чисто кириллические строки отсекаются префильтром без подсчёта)
+        if not skip and line_stripped and _LATIN_RE.search(line_stripped):
             # Считаем символы
-            latin_chars = len(re.findall(r'[a-zA-Z]', line_stripped))
-            cyrillic_chars = len(re.findall(r'[а-яА-ЯёЁ]', line_stripped))
+            folded = line_stripped.translate(_ALPHA_FOLD_TABLE)
+            latin_chars = folded.count('a')
+            cyrillic_chars = folded.count('я')
             total_alpha = latin_chars + cyrillic_chars
             
             # Если > 50% латиницы и при этом есть кириллические символы рядом с латиницей
             # (признак битой кодировки) - это мусор
             if total_alpha > 10 and latin_chars > total_alpha * 0.6:
                 # Исключаем нормальные паттерны: коды документов, email, авиационные термины
-                if not re.search(
-                    r'(ДП-|РК|СТО|КД-|РД-|ИОТ-|'
-                    r'ISO|IATA|ICAO|DCS|PNL|MVT|LDM|APIS|'
-                    r'EASA|FAA|MEL|CDL|SB|AD|AMP|MRB|RVSM|ETOPS|'
-                    r'MMEL|MPD|CMM|IPC|AMM|TSM|FIM|WDM|SRM|'
-                    r'AMOS|SAP|ERP|CRM|SMS|QMS|EFB|OCC|AOC|'
-                    r'NOTAM|SIGMET|METAR|TAF|RVR|ILS|VOR|NDB|DME|'
-                    r'PIC|SIC|FE|LAE|TRE|TRI|SFI|SFE|'
-                    r'Boeing|Airbus|ATR|Bombardier|Embraer|'
-                    r'B737|B767|A320|CRJ|DHC|'
-                    r'UTC|GMT|MSK|'
-                    r'@|http|www\.)',
-                    line_stripped
-                ):
+                if not _DOC_WHITELIST_RE.search(line_stripped):
                     skip = True
         
-        if not skip:
-            cleaned.append(line)
-    
-    # Убираем множественные пустые строки
-    result = []
-    prev_empty = False
-    for line in cleaned:
-        is_empty = not line.strip()
+        if skip:
+            continue
+        
+        # Убираем множественные пустые строки
+        is_empty = not line_stripped
         if is_empty and prev_empty:
             continue
-        result.append(line)
         prev_empty = is_empty
+        yield line
+
+
+def clean_markdown(markdown: str) -> str:
+    """
+    Очистка markdown от мусора.
+    
+    Удаляет:
+    - Колонтитулы (Дата введения... Стр. X из Y)
+    - Повторяющиеся названия документа в колонтитулах
+    - Мусор от титульных страниц (векторная графика с битой кодировкой)
+    - OCR мусор из схем и таблиц
+    - Пустые строки подряд
+    """
+    return '\n'.join(_iter_clean_lines(markdown))
+
+
+# Паттерн нумерованной секции: число.число (и так далее) в начале строки.
+# MULTILINE + [^\S\n] вместо \s: совпадение не переходит на следующую строку
+_SECTION_RE = re.compile(
+    r'^(?:#{1,6}[^\S\n]+)?(?:\*\*)?(\d+(?:\.\d+)*)\**[^\S\n]+(.+?)$',
+    re.MULTILINE
+)
+
+
+def _iter_section_spans(text: str) -> Iterator[Tuple[str, int, int]]:
+    """
+    Границы нумерованных секций в тексте (finditer по всему буферу).
     
-    return '\n'.join(result)
+    Yields:
+        (номер_пункта, начало, конец) - секция от строки заголовка до
+        следующего заголовка; текст до первого заголовка отбрасывается
+    """
+    prev = None
+    for match in _SECTION_RE.finditer(text):
+        if prev is not None:
+            yield prev.group(1), prev.start(), match.start()
+        prev = match
+    if prev is not None:
+        yield prev.group(1), prev.start(), len(text)
 
 
-def extract_sections_from_markdown(markdown: str) -> Dict[str, str]:
+def extract_sections_from_markdown(markdown: str, pre_cleaned: bool = False) -> Dict[str, str]:
     """
     Разбить Markdown на секции по нумерации.
     
@@ -194,94 +297,148 @@ def extract_sections_from_markdown(markdown: str) -> Dict[str, str]:
     или
     5.1 Заголовок (в начале строки)
     
+    Args:
+        markdown: Текст документа
+        pre_cleaned: Текст уже прошёл clean_markdown
+    
     Returns:
         Dict: {номер_пункта: контент}
     """
     # Сначала чистим от мусора
-    markdown = clean_markdown(markdown)
-    
-    sections = {}
-    
-    # Паттерн для поиска нумерованных секций
-    # Ищем: число.число (и так далее) в начале строки
-    section_pattern = r'^(?:#{1,6}\s+)?(?:\*\*)?(\d+(?:\.\d+)*)\**\s+(.+?)$'
-    
-    lines = markdown.split('\n')
-    current_num = None
-    current_content = []
-    
-    for line in lines:
-        # Проверяем, это новая секция?
-        match = re.match(section_pattern, line)
-        if match:
-            # Сохраняем предыдущую секцию
-            if current_num and current_content:
-                # Включаем заголовок в контент
-                sections[current_num] = '\n'.join(current_content).strip()
-            
-            # Начинаем новую секцию
-            current_num = match.group(1)
-            current_content = [line]
-        else:
-            # Продолжаем текущую секцию
-            current_content.append(line)
-    
-    # Сохраняем последнюю секцию
-    if current_num and current_content:
-        sections[current_num] = '\n'.join(current_content).strip()
+    if not pre_cleaned:
+        markdown = clean_markdown(markdown)
     
-    return sections
+    return {
+        num: markdown[start:end].strip()
+        for num, start, end in _iter_section_spans(markdown)
+    }
 
 
-def assign_content_to_tree(tree: DocumentTree, sections: Dict[str, str]) -> None:
+def assign_content_to_tree(
+    tree: DocumentTree,
+    sections: Dict[str, str],
+    nodes: Optional[List[SectionNode]] = None
+) -> None:
     """
     Присвоить контент узлам дерева.
     
     Args:
         tree: Дерево структуры
         sections: Словарь {номер: контент}
+        nodes: Уже развёрнутый flatten_tree(tree.root), чтобы не обходить дерево повторно
     """
-    nodes = flatten_tree(tree.root)
-    assigned = 0
+    if nodes is None:
+        nodes = flatten_tree(tree.root)
     
+    # Индекс номер -> узлы (один проход по дереву), далее обход только секций
+    nodes_by_num = {}
     for node in nodes:
-        if node.num in sections:
-            node.content = sections[node.num]
+        nodes_by_num.setdefault(node.num, []).append(node)
+    
+    assigned = 0
+    for num, content in sections.items():
+        for node in nodes_by_num.get(num, ()):
+            node.content = content
             assigned += 1
             
             # Определяем is_actionable
-            node.is_actionable = _check_actionable(node.content)
+            node.is_actionable = _check_actionable(content)
             if node.is_actionable:
                 tree.actionable_sections += 1
     
     print(f"   📝 Присвоен контент: {assigned}/{len(nodes)} узлов")
 
 
+def assign_markdown_to_tree(
+    tree: DocumentTree,
+    markdown: str,
+    nodes: Optional[List[SectionNode]] = None,
+    pre_cleaned: bool = False
+) -> int:
+    """
+    Очистка, разбиение на секции и присвоение контента.
+    
+    Эквивалент assign_content_to_tree(tree, extract_sections_from_markdown(markdown)):
+    срезы текста строятся только для номеров, которые есть в дереве.
+    
+    Args:
+        nodes: Уже развёрнутый flatten_tree(tree.root) (опционально)
+        pre_cleaned: Текст уже прошёл clean_markdown
+    
+    Returns:
+        Количество найденных нумерованных секций
+    """
+    if nodes is None:
+        nodes = flatten_tree(tree.root)
+    wanted = {node.num for node in nodes}
+    
+    if not pre_cleaned:
+        markdown = clean_markdown(markdown)
+    
+    found = set()
+    spans = {}
+    for num, start, end in _iter_section_spans(markdown):
+        found.add(num)
+        if num in wanted:
+            # Повтор номера перезаписывает секцию (как в словаре sections)
+            spans[num] = (start, end)
+    
+    sections = {num: markdown[start:end].strip() for num, (start, end) in spans.items()}
+    assign_content_to_tree(tree, sections, nodes)
+    return len(found)
+
+
+# Ключевые слова действий одной альтернацией: один поиск на пункт
+_ACTIONABLE_RE = re.compile(
+    r'несет\s+ответственность|'
+    r'несёт\s+ответственность|'
+    r'обязан[ыа]?\b|'
+    r'должен\b|'
+    r'должны\b|'
+    r'выполняет|'
+    r'осуществляет|'
+    r'проводит|'
+    r'обеспечивает|'
+    r'контролирует|'
+    r'согласовывает|'
+    r'утверждает|'
+    r'направляет|'
+    r'представляет|'
+    r'информирует',
+    re.IGNORECASE
+)
+
+
 def _check_actionable(content: str) -> bool:
     """Проверка, содержит ли пункт действие"""
-    action_keywords = [
-        r'несет\s+ответственность',
-        r'обязан[ыа]?\b',
-        r'должен\b',
-        r'должны\b',
-        r'выполняет',
-        r'осуществляет',
-        r'проводит',
-        r'обеспечивает',
-        r'контролирует',
-        r'согласовывает',
-        r'утверждает',
-        r'направляет',
-        r'представляет',
-        r'информирует',
-        r'несёт\s+ответственность',
-    ]
-    
-    content_lower = content.lower()
-    for keyword in action_keywords:
-        if re.search(keyword, content_lower):
-            return True
-    return False
+    return _ACTIONABLE_RE.search(content) is not None
+
+
+def _text_rich_pages(pdf_path: str) -> Set[int]:
+    """
+    Номера страниц (с 0), на которых OCR графики не нужен.
+    
+    Страница считается текстовой, если нативный текст >= TEXT_RICH_MIN_CHARS
+    символов и нет растровых изображений крупнее TEXT_RICH_MAX_IMAGE_RATIO
+    площади страницы (полностраничный скан всегда идёт в OCR).
+    """
+    if not FITZ_AVAILABLE:
+        return set()
+    
+    pages = set()
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            if len(page.get_text("text").strip()) < TEXT_RICH_MIN_CHARS:
+                continue
+            
+            page_area = abs(page.rect) or 1.0
+            largest_image = max(
+                (abs(fitz.Rect(info["bbox"])) for info in page.get_image_info()),
+                default=0.0
+            )
+            if largest_image / page_area < TEXT_RICH_MAX_IMAGE_RATIO:
+                pages.add(page.number)
+    return pages
 
 
 def parse_document_full(
@@ -289,7 +446,8 @@ def parse_document_full(
     enable_ocr: bool = True,
     ocr_base_url: str = "http://localhost:8000",
     use_pdfplumber: bool = False,
-    ocr_engine: str = "deepseek"
+    ocr_engine: str = "deepseek",
+    skip_ocr_text_pages: bool = False
 ) -> FullParseResult:
     """
     Полный парсинг документа.
@@ -303,6 +461,8 @@ def parse_document_full(
         enable_ocr: Использовать OCR для картинок
         ocr_base_url: URL OCR сервиса
         use_pdfplumber: Использовать pdfplumber (лучший порядок текста)
+        skip_ocr_text_pages: Не вызывать OCR графики на страницах с полным
+            нативным текстом (только для PyMuPDF пайплайна)
     
     Returns:
         FullParseResult
@@ -347,7 +507,8 @@ def parse_document_full(
             include_toc=False,  # Без оглавления
         )
         
-        full_markdown = pipeline.process(str(pdf_path))
+        skip_ocr_pages = _text_rich_pages(str(pdf_path)) if enable_ocr and skip_ocr_text_pages else None
+        full_markdown = pipeline.process(str(pdf_path), skip_ocr_pages=skip_ocr_pages)
     
     print(f"   ✅ Извлечено {len(full_markdown)} символов")
     
@@ -358,15 +519,7 @@ def parse_document_full(
     
     # Сортируем заголовки по номеру пункта ПЕРЕД построением дерева
     headings_list = [{"text": h.text, "level": h.level} for h in parse_result.headings]
-    
-    def heading_sort_key(h):
-        text = h.get("text", "")
-        num, level, title, stype = parse_section_number(text)
-        if not num:
-            return ((0,), text)  # Служебные в начало - tuple для консистентности
-        return (_sort_key_for_section(num), text)
-    
-    sorted_headings = sorted(headings_list, key=heading_sort_key)
+    sorted_headings = sorted(headings_list, key=_heading_sort_key)
     
     # Строим дерево из отсортированных заголовков
     tree = build_hierarchy(
@@ -377,22 +530,20 @@ def parse_document_full(
     
     print(f"   ✅ Построено дерево: {tree.total_sections} узлов, глубина {tree.max_depth}")
     
-    # 3. Разбиваем markdown на секции
-    print("\n📋 Этап 3: Разбиение на секции...")
-    
-    sections = extract_sections_from_markdown(full_markdown)
-    print(f"   ✅ Найдено {len(sections)} секций по нумерации")
-    
-    # 4. Присваиваем контент узлам
-    print("\n🔗 Этап 4: Присвоение контента...")
+    # 3-4. Разбиваем markdown на секции и присваиваем контент узлам (один проход)
+    print("\n📋 Этап 3: Разбиение на секции и присвоение контента...")
     
-    assign_content_to_tree(tree, sections)
+    # Очистка один раз: тот же текст пишется в full_content.md
+    cleaned_markdown = clean_markdown(full_markdown)
+    nodes = flatten_tree(tree.root)
+    sections_found = assign_markdown_to_tree(tree, cleaned_markdown, nodes, pre_cleaned=True)
+    print(f"   ✅ Найдено {sections_found} секций по нумерации")
     
     # Статистика
     stats = {
         "total_chars": len(full_markdown),
         "total_sections": tree.total_sections,
-        "sections_with_content": sum(1 for n in flatten_tree(tree.root) if n.content),
+        "sections_with_content": sum(1 for n in nodes if n.content),
         "actionable_sections": tree.actionable_sections,
         "max_depth": tree.max_depth,
     }
@@ -408,13 +559,33 @@ def parse_document_full(
         source=parse_result.source,
         full_markdown=full_markdown,
         tree=tree,
-        stats=stats
+        stats=stats,
+        cleaned_markdown=cleaned_markdown
     )
 
 
+def _heading_sort_key(heading: Dict) -> Tuple:
+    """
+    Ключ сортировки заголовка: (номер пункта, текст).
+    
+    sorted() вычисляет ключ один раз на элемент, а разбор номера и ключ
+    секции кэшируются (parse_section_number, _sort_key_for_section).
+    """
+    text = heading.get("text", "")
+    num, level, title, stype = parse_section_number(text)
+    if not num:
+        return ((0,), text)  # Служебные в начало - tuple для консистентности
+    return (_sort_key_for_section(num), text)
+
+
+_DIGITS_RE = re.compile(r'(\d+)')
+
+
+@lru_cache(maxsize=8192)
 def _sort_key_for_section(num: str) -> Tuple:
     """
-    Ключ сортировки для номера секции.
+    Ключ сортировки для номера секции (кэшируется: один и тот же номер
+    сортируется и при построении дерева, и при рендеринге).
     
     "5.1.2" -> (5, 1, 2)
     "Приложение 1" -> (9999, 1)  # Приложения в конец
@@ -425,7 +596,7 @@ def _sort_key_for_section(num: str) -> Tuple:
     
     # Приложения - в конец
     if num.lower().startswith('приложение'):
-        match = re.search(r'(\d+)', num)
+        match = _DIGITS_RE.search(num)
         if match:
             return (9999, int(match.group(1)))
         return (9999, 0)
@@ -440,12 +611,24 @@ def _sort_key_for_section(num: str) -> Tuple:
     return tuple(parts) if parts else (0,)
 
 
-def generate_full_structure_md(result: FullParseResult) -> str:
-    """
-    Генерация полного MD с иерархической структурой и контентом.
-    Секции сортируются по номеру пункта.
-    """
-    lines = [
+# Первая строка контента, повторяющая нумерованный заголовок пункта
+_CONTENT_HEADING_RE = re.compile(r'^(?:#{1,6}\s+)?(?:\*\*)?[\d.]+\**\s+.+$')
+
+
+def _write_joined(out: IO[str], lines: Iterable[str]) -> None:
+    """Записать строки через '\n' (как '\n'.join), не собирая результат в памяти"""
+    it = iter(lines)
+    for line in it:
+        out.write(line)
+        break
+    for line in it:
+        out.write('\n')
+        out.write(line)
+
+
+def _iter_structure_md_lines(result: FullParseResult) -> Iterator[str]:
+    """Строки полного MD с иерархической структурой (генератор)"""
+    yield from (
         f"# {result.doc_code}",
         "",
         f"**Источник:** {result.source.upper()}",
@@ -456,14 +639,14 @@ def generate_full_structure_md(result: FullParseResult) -> str:
         "",
         "---",
         "",
-    ]
+    )
     
-    def render_node(node: SectionNode, level: int = 1):
+    def render_node(node: SectionNode, level: int = 1) -> Iterator[str]:
         if node.id == "root":
             # Сортируем детей по номеру
             sorted_children = sorted(node.children, key=lambda n: _sort_key_for_section(n.num))
             for child in sorted_children:
-                render_node(child, 1)
+                yield from render_node(child, 1)
             return
         
         # Заголовок с нумерацией
@@ -471,30 +654,99 @@ def generate_full_structure_md(result: FullParseResult) -> str:
         num_part = f"{node.num} " if node.num else ""
         marker = "📌 " if node.is_actionable else ""
         
-        lines.append(f"{'#' * header_level} {marker}{num_part}{node.title}")
-        lines.append("")
+        yield f"{'#' * header_level} {marker}{num_part}{node.title}"
+        yield ""
         
         # Контент (если есть)
         if node.content:
             # Убираем повторение заголовка из контента
             content = node.content
             # Убираем первую строку если она совпадает с заголовком
-            first_line_match = re.match(r'^(?:#{1,6}\s+)?(?:\*\*)?[\d.]+\**\s+.+$', content.split('\n')[0])
-            if first_line_match:
-                content = '\n'.join(content.split('\n')[1:]).strip()
+            first_line, _, rest = content.partition('\n')
+            if _CONTENT_HEADING_RE.match(first_line):
+                content = rest.strip()
             
             if content:
-                lines.append(content)
-                lines.append("")
+                yield content
+                yield ""
         
         # Рекурсивно для детей (сортированных)
         sorted_children = sorted(node.children, key=lambda n: _sort_key_for_section(n.num))
         for child in sorted_children:
-            render_node(child, level + 1)
+            yield from render_node(child, level + 1)
+    
+    yield from render_node(result.tree.root)
+
+
+def generate_full_structure_md(result: FullParseResult) -> str:
+    """
+    Генерация полного MD с иерархической структурой и контентом.
+    Секции сортируются по номеру пункта.
+    """
+    return '\n'.join(_iter_structure_md_lines(result))
+
+
+def generate_full_structure_md_to(result: FullParseResult, out: IO[str]) -> None:
+    """Потоковый вариант generate_full_structure_md: строки сразу пишутся в out"""
+    _write_joined(out, _iter_structure_md_lines(result))
+
+
+def _process_one(
+    i: int,
+    total: int,
+    pdf_path: str,
+    output_dir: Path,
+    enable_ocr: bool,
+    ocr_base_url: str,
+    use_pdfplumber: bool,
+    skip_ocr_text_pages: bool
+) -> bool:
+    """
+    Полный парсинг одного документа и запись результатов в output_dir/NN_CODE/
+    
+    Выполняется в процессе-воркере: все тяжёлые этапы (извлечение текста,
+    OCR, построение дерева, запись файлов) - внутри.
     
-    render_node(result.tree.root)
+    Returns:
+        True при успехе, False при ошибке
+    """
+    print(f"\n[{i}/{total}] ", end="")
     
-    return '\n'.join(lines)
+    try:
+        result = parse_document_full(
+            pdf_path,
+            enable_ocr=enable_ocr,
+            ocr_base_url=ocr_base_url,
+            use_pdfplumber=use_pdfplumber,
+            skip_ocr_text_pages=skip_ocr_text_pages
+        )
+        
+        # Создаём папку для документа
+        doc_dir = output_dir / f"{i:02d}_{result.doc_code}"
+        doc_dir.mkdir(exist_ok=True)
+        
+        # Сохраняем полный markdown (очищенный в parse_document_full)
+        with open(doc_dir / "full_content.md", "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(result.cleaned_markdown)
+        
+        # Сохраняем структурированный markdown
+        with open(doc_dir / "structure.md", "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            generate_full_structure_md_to(result, f)
+        
+        # Сохраняем дерево в JSON
+        export_tree_json(result.tree, doc_dir / "structure_tree.json")
+        
+        # Сохраняем статистику
+        _write_json(doc_dir / "stats.json", result.stats)
+        
+        print(f"   💾 Сохранено в {doc_dir.name}/")
+        return True
+        
+    except Exception as e:
+        print(f"\n   ❌ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
 
 def process_documents(
@@ -502,10 +754,17 @@ def process_documents(
     output_dir: Path,
     enable_ocr: bool = True,
     ocr_base_url: str = "http://localhost:8000",
-    use_pdfplumber: bool = False
+    use_pdfplumber: bool = False,
+    jobs: int = 1,
+    skip_ocr_text_pages: bool = False
 ) -> None:
     """
     Обработка нескольких документов.
+    
+    Args:
+        jobs: Количество процессов (1 - последовательно, 0 - по числу CPU).
+            Документы независимы, каждый воркер создаёт свой pipeline/OCR-клиент.
+        skip_ocr_text_pages: Пропускать OCR графики на страницах с нативным текстом
     """
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -522,51 +781,35 @@ def process_documents(
     print(f"   Output: {output_dir}")
     print(f"{'='*60}")
     
-    results = []
+    total = len(pdf_paths)
+    args = (
+        range(1, total + 1),
+        repeat(total),
+        pdf_paths,
+        repeat(output_dir),
+        repeat(enable_ocr),
+        repeat(ocr_base_url),
+        repeat(use_pdfplumber),
+        repeat(skip_ocr_text_pages),
+    )
     
-    for i, pdf_path in enumerate(pdf_paths, 1):
-        print(f"\n[{i}/{len(pdf_paths)}] ", end="")
-        
-        try:
-            result = parse_document_full(
-                pdf_path,
-                enable_ocr=enable_ocr,
-                ocr_base_url=ocr_base_url,
-                use_pdfplumber=use_pdfplumber
-            )
-            results.append(result)
-            
-            # Создаём папку для документа
-            doc_dir = output_dir / f"{i:02d}_{result.doc_code}"
-            doc_dir.mkdir(exist_ok=True)
-            
-            # Сохраняем полный markdown (очищенный)
-            cleaned_markdown = clean_markdown(result.full_markdown)
-            with open(doc_dir / "full_content.md", "w", encoding="utf-8") as f:
-                f.write(cleaned_markdown)
-            
-            # Сохраняем структурированный markdown
-            structure_md = generate_full_structure_md(result)
-            with open(doc_dir / "structure.md", "w", encoding="utf-8") as f:
-                f.write(structure_md)
-            
-            # Сохраняем дерево в JSON
-            export_tree_json(result.tree, doc_dir / "structure_tree.json")
-            
-            # Сохраняем статистику
-            with open(doc_dir / "stats.json", "w", encoding="utf-8") as f:
-                json.dump(result.stats, f, ensure_ascii=False, indent=2)
-            
-            print(f"   💾 Сохранено в {doc_dir.name}/")
-            
-        except Exception as e:
-            print(f"\n   ❌ Ошибка: {e}")
-            import traceback
-            traceback.print_exc()
+    if jobs == 1:
+        succeeded = sum(map(_process_one, *args))
+    else:
+        # fork (только Linux): воркеры наследуют уже импортированный модуль и
+        # скомпилированные регулярки через COW, без повторного импорта/компиляции
+        # как при spawn/forkserver (по умолчанию в новых Python). На macOS fork
+        # после загрузки системных фреймворков небезопасен - там контекст по умолчанию
+        mp_context = (
+            multiprocessing.get_context("fork")
+            if sys.platform.startswith("linux") else None
+        )
+        with ProcessPoolExecutor(max_workers=jobs or None, mp_context=mp_context) as executor:
+            succeeded = sum(executor.map(_process_one, *args))
     
     # Общая статистика
     print(f"\n{'='*60}")
-    print(f"✅ ЗАВЕРШЕНО: {len(results)}/{len(pdf_paths)} документов")
+    print(f"✅ ЗАВЕРШЕНО: {succeeded}/{len(pdf_paths)} документов")
     print(f"{'='*60}")
 
 
@@ -599,6 +842,10 @@ if __name__ == "__main__":
                        help="Директория с документами")
     parser.add_argument("--output", type=str, default="/home/budnik_an/Obligations/output3/full_parse",
                        help="Директория для результатов")
+    parser.add_argument("--skip-ocr-text-pages", action="store_true",
+                       help="Не отправлять в OCR графику страниц с полным нативным текстом")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                       help="Количество процессов (1 - последовательно, 0 - по числу CPU)")
     
     args = parser.parse_args()
     
@@ -618,5 +865,7 @@ if __name__ == "__main__":
         [str(p) for p in pdfs],
         Path(args.output),
         enable_ocr=not args.no_ocr,
-        use_pdfplumber=args.pdfplumber
+        use_pdfplumber=args.pdfplumber,
+        jobs=args.jobs,
+        skip_ocr_text_pages=args.skip_ocr_text_pages
     )
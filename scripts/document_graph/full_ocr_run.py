@@ -4,9 +4,12 @@
 С засечением времени и логированием
 """
 
+import os
 import sys
 import time
 import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Отключаем буферизацию для real-time логирования
 sys.stdout.reconfigure(line_buffering=True)
@@ -19,6 +22,25 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from scripts.pdf_to_context.pipeline import PDFToContextPipeline
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Параллельные запросы к OCR-сервису (узкое место - сервер, а не CPU клиента).
+# Воркеры - процессы: PyMuPDF не потокобезопасен даже на разных документах
+OCR_RUN_WORKERS = int(os.getenv("OCR_RUN_WORKERS", "1"))
+
+# Свой pipeline на процесс: экземпляр не рассчитан на конкурентный вызов process()
+_pipeline = None
+
 
 def format_duration(seconds):
     """Форматирование длительности"""
@@ -32,6 +54,112 @@ def format_duration(seconds):
         return f"{hours} ч {mins} мин"
 
 
+def _write_json(path: Path, data) -> None:
+    """Записать JSON с отступом 2 (orjson - C-сериализация сразу в UTF-8 байты)"""
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _file_digest(path: Path) -> str:
+    """
+    Хэш содержимого файла для докачки: "<алгоритм>:<hex>"
+    
+    xxh3_64 если установлен xxhash, иначе blake2b-64. Алгоритм входит в
+    строку, поэтому смена окружения приводит к переобработке, а не к ложному
+    совпадению.
+    """
+    if XXHASH_AVAILABLE:
+        h, algo = xxhash.xxh3_64(), "xxh3_64"
+    else:
+        h, algo = hashlib.blake2b(digest_size=8), "blake2b64"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return f"{algo}:{h.hexdigest()}"
+
+
+def _get_pipeline() -> PDFToContextPipeline:
+    """Pipeline с OCR для текущего процесса (создаётся при первом обращении)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = PDFToContextPipeline(
+            enable_ocr=True,
+            ocr_base_url="http://localhost:8000"
+        )
+    return _pipeline
+
+
+def _ocr_one(pdf_path: Path, output_base: Path) -> dict:
+    """
+    OCR одного PDF (в основном процессе или в процессе пула)
+    
+    Returns:
+        Запись для stats["files"] (status: success / skipped / failed)
+    """
+    file_start = time.time()
+    
+    # Извлекаем код документа из имени папки
+    doc_code = pdf_path.parent.name.split(" ^")[0] if " ^" in pdf_path.parent.name else pdf_path.stem
+    
+    try:
+        # Выходной файл и хэш PDF, по которому он получен
+        output_file = output_base / f"{doc_code}_OCR.md"
+        hash_file = output_file.with_suffix(".sha")
+        
+        # Проверяем не обработан ли уже
+        if output_file.exists():
+            # Результат старого прогона без хэша - доверяем как раньше
+            if not hash_file.exists():
+                return {
+                    "code": doc_code,
+                    "status": "skipped",
+                    "reason": "already exists"
+                }
+            digest = _file_digest(pdf_path)
+            if hash_file.read_text(encoding="utf-8").strip() == digest:
+                return {
+                    "code": doc_code,
+                    "status": "skipped",
+                    "reason": "unchanged"
+                }
+            # PDF изменился - переобрабатываем
+        else:
+            digest = _file_digest(pdf_path)
+        
+        # Обработка - process() возвращает markdown строку
+        pipeline = _get_pipeline()
+        markdown_result = pipeline.process(str(pdf_path), output_path=str(output_file))
+        
+        if markdown_result:
+            file_time = time.time() - file_start
+            hash_file.write_text(digest, encoding="utf-8")
+            
+            # Число страниц уже известно pipeline - PDF повторно не открываем
+            pages = pipeline.last_page_count
+            
+            return {
+                "code": doc_code,
+                "status": "success",
+                "pages": pages,
+                "time": file_time,
+                "output": str(output_file)
+            }
+        else:
+            raise Exception("Пустой результат")
+            
+    except Exception as e:
+        return {
+            "code": doc_code,
+            "status": "failed",
+            "error": str(e),
+            "time": time.time() - file_start
+        }
+
+
 def main():
     start_time = time.time()
     start_datetime = datetime.now()
@@ -72,72 +200,32 @@ def main():
         "files": []
     }
     
-    # Pipeline с OCR
-    pipeline = PDFToContextPipeline(
-        enable_ocr=True,
-        ocr_base_url="http://localhost:8000"
-    )
+    # Обработка файлов пулом процессов: пока один файл ждёт OCR-сервис,
+    # другие готовят страницы; OCR_RUN_WORKERS=1 - последовательно
+    print(f"⚙️ Процессов OCR: {OCR_RUN_WORKERS}")
     
-    # Обработка каждого файла
-    for idx, pdf_path in enumerate(pdf_files, 1):
-        file_start = time.time()
-        
-        # Извлекаем код документа из имени папки
-        doc_code = pdf_path.parent.name.split(" ^")[0] if " ^" in pdf_path.parent.name else pdf_path.stem
+    # Записи по индексу входного списка: лог не зависит от порядка завершения
+    entries = [None] * total_files
+    
+    def _collect(idx: int, i: int, entry: dict) -> None:
+        """Учесть результат очередного файла: статистика, прогресс, лог"""
+        pdf_path = pdf_files[i]
+        entries[i] = entry
         
-        print(f"\n[{idx}/{total_files}] 📄 {doc_code}")
+        print(f"\n[{idx}/{total_files}] 📄 {entry['code']}")
         print(f"    Файл: {pdf_path.name}")
         
-        try:
-            # Выходной файл
-            output_file = output_base / f"{doc_code}_OCR.md"
-            
-            # Проверяем не обработан ли уже
-            if output_file.exists():
-                print(f"    ⏭️ Пропущен (уже существует)")
-                stats["skipped"] += 1
-                stats["files"].append({
-                    "code": doc_code,
-                    "status": "skipped",
-                    "reason": "already exists"
-                })
-                continue
-            
-            # Обработка - process() возвращает markdown строку
-            markdown_result = pipeline.process(str(pdf_path), output_path=str(output_file))
-            
-            if markdown_result:
-                file_time = time.time() - file_start
-                
-                # Подсчитываем страницы из PDF
-                import fitz
-                with fitz.open(str(pdf_path)) as doc:
-                    pages = len(doc)
-                
-                stats["success"] += 1
-                stats["total_pages"] += pages
-                stats["files"].append({
-                    "code": doc_code,
-                    "status": "success",
-                    "pages": pages,
-                    "time": file_time,
-                    "output": str(output_file)
-                })
-                
-                print(f"    ✅ Успешно: {pages} стр, {format_duration(file_time)}")
-            else:
-                raise Exception("Пустой результат")
-                
-        except Exception as e:
-            file_time = time.time() - file_start
+        if entry["status"] == "skipped":
+            stats["skipped"] += 1
+            reason = "PDF не изменился" if entry["reason"] == "unchanged" else "уже существует"
+            print(f"    ⏭️ Пропущен ({reason})")
+        elif entry["status"] == "success":
+            stats["success"] += 1
+            stats["total_pages"] += entry["pages"]
+            print(f"    ✅ Успешно: {entry['pages']} стр, {format_duration(entry['time'])}")
+        else:
             stats["failed"] += 1
-            stats["files"].append({
-                "code": doc_code,
-                "status": "failed",
-                "error": str(e),
-                "time": file_time
-            })
-            print(f"    ❌ Ошибка: {e}")
+            print(f"    ❌ Ошибка: {entry['error']}")
         
         # Прогресс и ETA
         elapsed = time.time() - start_time
@@ -149,9 +237,21 @@ def main():
         
         # Сохраняем промежуточный лог
         if idx % 10 == 0:
+            stats["files"] = [e for e in entries if e is not None]
             stats["elapsed_time"] = elapsed
-            with open(log_file, "w", encoding="utf-8") as f:
-                json.dump(stats, f, ensure_ascii=False, indent=2)
+            _write_json(log_file, stats)
+    
+    if OCR_RUN_WORKERS == 1:
+        for i, pdf in enumerate(pdf_files):
+            _collect(i + 1, i, _ocr_one(pdf, output_base))
+    else:
+        with ProcessPoolExecutor(max_workers=OCR_RUN_WORKERS) as executor:
+            futures = {executor.submit(_ocr_one, pdf, output_base): i for i, pdf in enumerate(pdf_files)}
+            
+            for idx, future in enumerate(as_completed(futures), 1):
+                _collect(idx, futures[future], future.result())
+    
+    stats["files"] = [e for e in entries if e is not None]
     
     # Финальная статистика
     total_time = time.time() - start_time
@@ -161,8 +261,7 @@ def main():
     stats["end_time"] = end_datetime.isoformat()
     
     # Сохраняем финальный лог
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
+    _write_json(log_file, stats)
     
     print()
     print("=" * 70)
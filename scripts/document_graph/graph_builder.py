@@ -4,14 +4,16 @@
 """
 
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Set, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .hybrid_parser import ParseResult
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from .models import (
     Document, DocumentGraph, GraphNode, GraphEdge,
@@ -21,7 +23,7 @@ from .parser import (
     scan_documents_folder, get_process_info, normalize_process_code,
     normalize_document_code, PROCESS_REGISTRY
 )
-from .pdf_extractor import extract_references
+from .pdf_extractor import extract_references, extract_document_metadata
 
 # Импорт гибридного парсера для извлечения структуры
 try:
@@ -29,6 +31,7 @@ try:
         parse_document,
         format_parse_report,
         parse_documents_batch,
+        build_docx_index,
         ParseResult,
     )
     HYBRID_PARSER_AVAILABLE = True
@@ -45,6 +48,54 @@ def _print_progress(current: int, total: int, filename: str):
     print(f"\r   [{bar}] {pct:5.1f}% ({current}/{total}) {filename[:40]:<40}", end='', flush=True)
 
 
+def _load_refs(full_md: Path, doc_code: str, doc_key: str) -> Optional[List[str]]:
+    """Прочитать full_content.md и извлечь нормализованные ссылки (None - файл не прочитан)"""
+    try:
+        text = full_md.read_text(encoding="utf-8")
+    except Exception:
+        return None
+    refs_raw = extract_references(text, doc_code)
+    normalized_refs = set()
+    for ref in refs_raw:
+        ref_norm = normalize_document_code(ref)
+        if ref_norm and ref_norm != doc_key:
+            normalized_refs.add(ref_norm)
+    return sorted(normalized_refs)
+
+
+def _parse_structure_block(pdf_paths: List[str], docx_base_dir: Optional[str]) -> list:
+    """
+    Разобрать блок документов в дочернем процессе
+    
+    Returns:
+        Список (путь, ParseResult или None, текст ошибки или None) в порядке pdf_paths
+    """
+    # Директорию DOCX обходим один раз на весь блок
+    docx_index = build_docx_index(docx_base_dir) if docx_base_dir else None
+    
+    outcomes = []
+    for pdf_path in pdf_paths:
+        try:
+            outcomes.append((pdf_path, parse_document(pdf_path, docx_base_dir, docx_index), None))
+        except Exception as e:
+            outcomes.append((pdf_path, None, str(e)))
+    return outcomes
+
+
+def _extract_one(pdf_path: Path, code: str, docx_path: Optional[Path], catalog_entry):
+    """Извлечь метаданные одного документа (выполняется в дочернем процессе)"""
+    try:
+        return extract_document_metadata(
+            pdf_path,
+            code,
+            docx_path=docx_path,
+            catalog_entry=catalog_entry
+        )
+    except Exception:
+        # Продолжаем при ошибках
+        return None
+
+
 class DocumentGraphBuilder:
     """Строитель графа документов"""
     
@@ -55,14 +106,18 @@ class DocumentGraphBuilder:
         self.process_groups: Set[ProcessGroup] = set()
         self.metadata_cache: Dict[str, dict] = {}
     
-    def scan_folder(self, folder_path: Path) -> int:
+    def scan_folder(self, folder_path: Path, jobs: int = 1) -> int:
         """
         Сканировать папку с документами
         
+        Args:
+            folder_path: Путь к папке с документами
+            jobs: Количество процессов (1 - последовательно, 0 - по числу CPU)
+        
         Returns:
             Количество найденных документов
         """
-        docs = scan_documents_folder(folder_path)
+        docs = scan_documents_folder(folder_path, jobs=jobs)
         self.documents.extend(docs)
         return len(docs)
 
@@ -81,34 +136,52 @@ class DocumentGraphBuilder:
                 index[normalize_document_code(code)] = full_md
         return index
 
-    def load_full_content_references(self, full_content_root: Path) -> int:
-        """Загрузить ссылки из full_content.md"""
+    def load_full_content_references(self, full_content_root: Path, workers: int = 16) -> int:
+        """
+        Загрузить ссылки из full_content.md
+        
+        Args:
+            full_content_root: Папка с результатами полного парсинга
+            workers: Количество потоков чтения (1 - последовательно)
+        
+        Returns:
+            Общее количество найденных ссылок
+        """
         index = self.build_full_content_index(full_content_root)
         if not index:
             return 0
-        total_refs = 0
+        
+        tasks = []
         for doc in self.documents:
             doc_key = normalize_document_code(doc.code)
             full_md = index.get(doc_key)
-            if not full_md:
-                continue
-            try:
-                text = full_md.read_text(encoding="utf-8")
-            except Exception:
+            if full_md:
+                tasks.append((doc, full_md, doc_key))
+        
+        args = ([full_md for _, full_md, _ in tasks],
+                [doc.code for doc, _, _ in tasks],
+                [doc_key for _, _, doc_key in tasks])
+        
+        # Чтение файлов упирается в диск - потоки перекрывают ожидание I/O;
+        # документы обновляются уже в основном потоке
+        if workers == 1 or len(tasks) < 2:
+            results = list(map(_load_refs, *args))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_load_refs, *args))
+        
+        total_refs = 0
+        for (doc, _, _), refs in zip(tasks, results):
+            if refs is None:
                 continue
-            refs_raw = extract_references(text, doc.code)
-            normalized_refs = set()
-            for ref in refs_raw:
-                ref_norm = normalize_document_code(ref)
-                if ref_norm and ref_norm != doc_key:
-                    normalized_refs.add(ref_norm)
-            doc.references = sorted(normalized_refs)
-            total_refs += len(doc.references)
+            doc.references = refs
+            total_refs += len(refs)
         return total_refs
     
     def extract_metadata(self, max_pages: int = 50, 
                          docx_base_path: Path = None,
-                         xlsx_catalog_path: Path = None) -> int:
+                         xlsx_catalog_path: Path = None,
+                         jobs: int = 1) -> int:
         """
         Извлечь метаданные из PDF файлов с использованием всех источников
         
@@ -121,14 +194,14 @@ class DocumentGraphBuilder:
             max_pages: Максимум страниц для чтения при поиске ссылок
             docx_base_path: Путь к папке с DOCX файлами
             xlsx_catalog_path: Путь к xlsx файлу каталога
+            jobs: Количество процессов (1 - последовательно, 0 - по числу CPU)
             
         Returns:
             Количество обработанных документов
         """
         try:
-            from .pdf_extractor import extract_document_metadata
             from .docx_extractor import find_docx_for_pdf
-            from .xlsx_catalog import load_catalog, find_in_catalog
+            from .xlsx_catalog import load_catalog, find_in_catalog, build_prefix_index
         except ImportError as e:
             print(f"⚠️ Модули недоступны: {e}")
             return 0
@@ -139,6 +212,8 @@ class DocumentGraphBuilder:
             print(f"📊 Загрузка каталога: {xlsx_catalog_path.name}")
             catalog = load_catalog(xlsx_catalog_path)
             print(f"   Загружено: {len(catalog)} записей")
+        # Поиск по префиксу без перебора всего каталога на каждый документ
+        prefix_index = build_prefix_index(catalog)
         
         # Определяем базовый путь для DOCX
         if docx_base_path is None and self.documents:
@@ -157,7 +232,10 @@ class DocumentGraphBuilder:
         
         print(f"\n📖 Извлечение метаданных из {total} документов...")
         
-        for i, doc in enumerate(self.documents):
+        # Сопоставление с DOCX и каталогом дешёвое - делаем его заранее,
+        # чтобы в дочерние процессы уходили только готовые аргументы
+        tasks = []
+        for doc in self.documents:
             if not doc.file_path:
                 continue
             
@@ -165,51 +243,64 @@ class DocumentGraphBuilder:
             if not pdf_path.exists():
                 continue
             
-            _print_progress(i + 1, total, pdf_path.name)
+            # Ищем соответствующий DOCX
+            docx_path = None
+            if docx_base_path:
+                docx_path = find_docx_for_pdf(pdf_path, docx_base_path)
+                if docx_path:
+                    docx_found += 1
             
-            try:
-                # Ищем соответствующий DOCX
-                docx_path = None
-                if docx_base_path:
-                    docx_path = find_docx_for_pdf(pdf_path, docx_base_path)
-                    if docx_path:
-                        docx_found += 1
-                
-                # Ищем в каталоге
-                catalog_entry = None
-                if catalog:
-                    catalog_entry = find_in_catalog(catalog, doc.code)
-                    if catalog_entry:
-                        catalog_found += 1
-                
-                # Извлекаем метаданные со всех источников
-                metadata = extract_document_metadata(
-                    pdf_path, 
-                    doc.code,
-                    docx_path=docx_path,
-                    catalog_entry=catalog_entry
-                )
-                
-                # Обновляем документ
-                doc.title = metadata.title
-                doc.approval_date = metadata.approval_date
-                doc.effective_date = metadata.effective_date
-                doc.pages = metadata.pages
-                doc.references = metadata.references
-                
-                processed += 1
-                
-            except Exception as e:
-                # Продолжаем при ошибках
-                pass
+            # Ищем в каталоге
+            catalog_entry = None
+            if catalog:
+                catalog_entry = find_in_catalog(catalog, doc.code, prefix_index)
+                if catalog_entry:
+                    catalog_found += 1
+            
+            tasks.append((doc, pdf_path, docx_path, catalog_entry))
+        
+        args = [(pdf_path, doc.code, docx_path, catalog_entry)
+                for doc, pdf_path, docx_path, catalog_entry in tasks]
+        
+        if jobs == 1 or len(tasks) < 2:
+            processed = self._apply_metadata(tasks, (_extract_one(*a) for a in args))
+        else:
+            workers = jobs or os.cpu_count() or 1
+            # Крупные порции снижают накладные расходы IPC на каждый документ
+            chunksize = max(1, len(tasks) // (4 * workers))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_extract_one, *zip(*args), chunksize=chunksize)
+                processed = self._apply_metadata(tasks, results)
         
         print()  # Новая строка после прогресс-бара
         print(f"   📄 DOCX найдено: {docx_found} из {total}")
         print(f"   📊 В каталоге: {catalog_found} из {total}")
         return processed
     
+    def _apply_metadata(self, tasks: list, results) -> int:
+        """Перенести результаты извлечения в документы (в основном процессе)"""
+        processed = 0
+        total = len(tasks)
+        
+        for i, ((doc, pdf_path, _, _), metadata) in enumerate(zip(tasks, results)):
+            _print_progress(i + 1, total, pdf_path.name)
+            if metadata is None:
+                continue
+            
+            # Обновляем документ
+            doc.title = metadata.title
+            doc.approval_date = metadata.approval_date
+            doc.effective_date = metadata.effective_date
+            doc.pages = metadata.pages
+            doc.references = metadata.references
+            
+            processed += 1
+        
+        return processed
+    
     def parse_document_structure(self, docx_base_path: Path = None, 
-                                  verbose: bool = True) -> List[ParseResult]:
+                                  verbose: bool = True,
+                                  jobs: int = 1) -> List[ParseResult]:
         """
         Парсинг структуры документов с помощью гибридного парсера
         
@@ -218,6 +309,7 @@ class DocumentGraphBuilder:
         Args:
             docx_base_path: Базовая директория для поиска DOCX файлов
             verbose: Выводить прогресс и отчёты
+            jobs: Количество процессов (1 - последовательно, 0 - по числу CPU)
             
         Returns:
             Список результатов парсинга для каждого документа
@@ -252,12 +344,40 @@ class DocumentGraphBuilder:
         if verbose:
             print(f"\n📊 Парсинг структуры {len(pdf_paths)} документов...")
         
+        paths = [str(p) for p in pdf_paths]
+        docx_base_dir = str(docx_base_path) if docx_base_path else None
+        
         # Запускаем гибридный парсер
-        results = parse_documents_batch(
-            [str(p) for p in pdf_paths],
-            docx_base_dir=str(docx_base_path) if docx_base_path else None,
-            verbose=verbose
-        )
+        if jobs == 1 or len(paths) < 2:
+            results = parse_documents_batch(paths, docx_base_dir=docx_base_dir, verbose=verbose)
+        else:
+            # Каждый процесс получает свой блок документов: запуск процесса и
+            # индекс DOCX окупаются на всём блоке, а не на одном файле
+            workers = min(jobs or os.cpu_count() or 1, len(paths))
+            size = -(-len(paths) // workers)
+            chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+            
+            # map() сохраняет порядок блоков, а значит и исходный порядок документов
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                batches = executor.map(
+                    _parse_structure_block,
+                    chunks,
+                    [docx_base_dir] * len(chunks),
+                )
+                outcomes = [outcome for batch in batches for outcome in batch]
+            
+            # Документы с ошибкой в результат не попадают, как в parse_documents_batch;
+            # ошибки воркеров печатаем здесь
+            results = []
+            for pdf_path, result, error in outcomes:
+                if result is not None:
+                    results.append(result)
+                if verbose:
+                    if error is not None:
+                        print(f"  {Path(pdf_path).stem} ✗ Ошибка: {error}")
+                    else:
+                        source_info = "DOCX" if result.source == "docx" else "PDF"
+                        print(f"  {Path(pdf_path).stem} → {source_info}: {len(result.headings)} заголовков")
         
         # Статистика
         docx_count = sum(1 for r in results if r.source == "docx")
@@ -489,10 +609,12 @@ class DocumentGraphBuilder:
         # 6. Добавляем узлы документов
         # Создаём маппинг код -> doc_id для связей
         code_to_id = {}
+        # Нормализованные коды нужны и здесь, и при разборе ссылок - считаем один раз
+        doc_keys = [normalize_document_code(doc.code) for doc in self.documents]
         
-        for doc in self.documents:
-            doc_id = f"doc_{doc.code.replace('.', '_').replace('-', '_')}"
-            code_to_id[normalize_document_code(doc.code)] = doc_id
+        for doc, doc_key in zip(self.documents, doc_keys):
+            doc_id = doc.node_id
+            code_to_id[doc_key] = doc_id
             
             self.graph.add_node(GraphNode(
                 id=doc_id,
@@ -533,30 +655,30 @@ class DocumentGraphBuilder:
                 ))
         
         # 6. Добавляем связи между документами (ссылки)
-        references_count = 0
-        for doc in self.documents:
+        reference_edges = []
+        for doc, doc_key in zip(self.documents, doc_keys):
             if not doc.references:
                 continue
             
-            source_id = code_to_id.get(normalize_document_code(doc.code))
+            source_id = code_to_id.get(doc_key)
             if not source_id:
                 continue
             
-            for ref_code in doc.references:
-                target_id = code_to_id.get(normalize_document_code(ref_code))
-                if target_id and target_id != source_id:
-                    self.graph.add_edge(GraphEdge(
-                        source=source_id,
-                        target=target_id,
-                        edge_type="references"
-                    ))
-                    references_count += 1
+            target_ids = [code_to_id.get(normalize_document_code(ref_code)) for ref_code in doc.references]
+            reference_edges.extend(
+                GraphEdge(source=source_id, target=target_id, edge_type="references")
+                for target_id in target_ids
+                if target_id and target_id != source_id
+            )
+        
+        self.graph.edges.extend(reference_edges)
+        references_count = len(reference_edges)
         
         if references_count > 0:
             print(f"   🔗 Найдено связей-ссылок: {references_count}")
 
-        self._prune_orphan_edges()
-        self._prune_orphan_documents()
+        degree = self._prune_orphan_edges()
+        self._prune_orphan_documents(degree)
         
         # 6. Метаданные
         self.graph.metadata = {
@@ -569,19 +691,29 @@ class DocumentGraphBuilder:
         
         return self.graph
 
-    def _prune_orphan_edges(self) -> None:
-        """Удалить связи с отсутствующими узлами"""
+    def _prune_orphan_edges(self) -> Counter:
+        """
+        Удалить связи с отсутствующими узлами
+        
+        Returns:
+            Степени узлов по оставшимся связям (считаются в том же проходе)
+        """
         node_ids = {node.id for node in self.graph.nodes}
         before = len(self.graph.edges)
-        self.graph.edges = [
-            edge for edge in self.graph.edges
-            if edge.source in node_ids and edge.target in node_ids
-        ]
-        removed = before - len(self.graph.edges)
+        degree = Counter()
+        edges = []
+        for edge in self.graph.edges:
+            if edge.source in node_ids and edge.target in node_ids:
+                edges.append(edge)
+                degree[edge.source] += 1
+                degree[edge.target] += 1
+        self.graph.edges = edges
+        removed = before - len(edges)
         if removed:
             print(f"   🧹 Удалены пустые связи: {removed}")
+        return degree
 
-    def _prune_orphan_documents(self) -> None:
+    def _prune_orphan_documents(self, degree: Counter) -> None:
         """Удалить устаревшие документы без связей"""
         def base_code(code: str) -> str:
             match = re.match(r"^(.*?)-(\d+)$", code)
@@ -589,12 +721,6 @@ class DocumentGraphBuilder:
                 return match.group(1)
             return code
 
-        # Считаем степень узлов
-        degree = defaultdict(int)
-        for edge in self.graph.edges:
-            degree[edge.source] += 1
-            degree[edge.target] += 1
-
         # Определяем последние версии
         latest_by_base: Dict[str, tuple] = {}
         for doc in self.documents:
@@ -612,13 +738,12 @@ class DocumentGraphBuilder:
         removed = []
         kept = []
         for doc in self.documents:
-            doc_id = f"doc_{doc.code.replace('.', '_').replace('-', '_')}"
-            if degree.get(doc_id, 0) > 0:
+            if degree[doc.node_id] > 0:
                 continue
             base = base_code(doc.code)
             latest = latest_by_base.get(base)
             if latest and latest[1] != doc.code:
-                removed.append(doc.code)
+                removed.append(doc.node_id)
             else:
                 kept.append(doc.code)
 
@@ -627,14 +752,12 @@ class DocumentGraphBuilder:
 
         if removed:
             before_nodes = len(self.graph.nodes)
-            self.graph.nodes = [n for n in self.graph.nodes if n.id not in {
-                f"doc_{code.replace('.', '_').replace('-', '_')}" for code in removed
-            }]
-            self.graph.edges = [e for e in self.graph.edges if e.source not in {
-                f"doc_{code.replace('.', '_').replace('-', '_')}" for code in removed
-            } and e.target not in {
-                f"doc_{code.replace('.', '_').replace('-', '_')}" for code in removed
-            }]
+            removed_ids = set(removed)
+            self.graph.nodes = [n for n in self.graph.nodes if n.id not in removed_ids]
+            self.graph.edges = [
+                e for e in self.graph.edges
+                if e.source not in removed_ids and e.target not in removed_ids
+            ]
             print(f"   🗑️ Удалены устаревшие без связей: {len(removed)} (узлов: {before_nodes} -> {len(self.graph.nodes)})")
         if kept:
             print(f"   ⚠️ Без связей (актуальные/без версии): {len(kept)}")
@@ -9,9 +9,16 @@
 import re
 import json
 from dataclasses import dataclass, field, asdict
+from functools import lru_cache
 from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 # =============================================================================
 # Data Classes
@@ -125,10 +132,14 @@ def is_garbage(text: str) -> bool:
     return False
 
 
+@lru_cache(maxsize=4096)
 def parse_section_number(text: str) -> Tuple[Optional[str], int, str, str]:
     """
     Парсинг нумерации из текста заголовка.
     
+    Результат кэшируется: один и тот же заголовок разбирается при сортировке
+    (full_hierarchy_parser) и повторно в build_hierarchy.
+    
     Returns:
         (num, level, title, section_type)
         - num: "5.1.2" или "Приложение 1" или None
@@ -378,9 +389,13 @@ def _is_actionable_content(content: str) -> bool:
 # =============================================================================
 
 def export_tree_json(tree: DocumentTree, output_path: Path) -> None:
-    """Сохранение дерева в JSON"""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(tree.to_dict(), f, ensure_ascii=False, indent=2)
+    """Сохранение дерева в JSON (orjson - C-сериализация сразу в UTF-8 байты)"""
+    if ORJSON_AVAILABLE:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(tree.to_dict(), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(tree.to_dict(), f, ensure_ascii=False, indent=2)
 
 
 def export_tree_markdown(tree: DocumentTree, output_path: Path) -> None:
@@ -28,6 +28,7 @@ from .docx_parser import (
     extract_structure_docx,
     validate_docx_vs_pdf,
     find_docx_for_pdf,
+    build_docx_index,
     ValidationResult,
     extract_doc_code,
     DOCX_AVAILABLE,
@@ -175,7 +176,8 @@ def extract_structure_pdf(pdf_path: str) -> Tuple[List[Heading], FilterReport]:
     return headings, report
 
 
-def parse_document(pdf_path: str, docx_base_dir: str = None) -> ParseResult:
+def parse_document(pdf_path: str, docx_base_dir: str = None,
+                   docx_index: Dict[str, str] = None) -> ParseResult:
     """
     Основная функция парсинга документа
     
@@ -188,6 +190,7 @@ def parse_document(pdf_path: str, docx_base_dir: str = None) -> ParseResult:
     Args:
         pdf_path: Путь к PDF
         docx_base_dir: Базовая директория для поиска DOCX
+        docx_index: Готовый индекс DOCX (см. build_docx_index)
         
     Returns:
         ParseResult с результатами
@@ -205,7 +208,7 @@ def parse_document(pdf_path: str, docx_base_dir: str = None) -> ParseResult:
     )
     
     # 1. Ищем DOCX
-    docx_path = find_docx_for_pdf(pdf_path, docx_base_dir)
+    docx_path = find_docx_for_pdf(pdf_path, docx_base_dir, docx_index)
     
     if docx_path and DOCX_AVAILABLE:
         result.docx_path = docx_path
@@ -360,12 +363,15 @@ def parse_documents_batch(pdf_paths: List[str], docx_base_dir: str = None, verbo
     """
     results = []
     
+    # Директорию DOCX обходим один раз на весь пакет
+    docx_index = build_docx_index(docx_base_dir) if docx_base_dir else None
+    
     for i, pdf_path in enumerate(pdf_paths, 1):
         if verbose:
             print(f"[{i}/{len(pdf_paths)}] {Path(pdf_path).stem}...")
         
         try:
-            result = parse_document(pdf_path, docx_base_dir)
+            result = parse_document(pdf_path, docx_base_dir, docx_index)
             results.append(result)
             
             if verbose:
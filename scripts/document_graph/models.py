@@ -3,10 +3,15 @@
 """
 
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import List, Dict, Optional
 from enum import Enum
 
 
+# Точки и дефисы в коде недопустимы в id узла графа
+_NODE_ID_TABLE = str.maketrans({'.': '_', '-': '_'})
+
+
 class ProcessGroup(Enum):
     """Группы процессов СМК"""
     M = "Процессы менеджмента"
@@ -84,6 +89,11 @@ class Document:
             return ""
         parts = self.process_code.split('.')
         return parts[0] if parts else ""
+    
+    @cached_property
+    def node_id(self) -> str:
+        """ID узла документа в графе (doc_ДП_М1_020_06)"""
+        return "doc_" + self.code.translate(_NODE_ID_TABLE)
 
 
 @dataclass
@@ -4,6 +4,8 @@
 """
 
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Tuple, List
 from dataclasses import dataclass
@@ -84,31 +86,36 @@ DOC_TYPE_MAP = {
 }
 
 
+_PROCESS_CODE_MAP = {
+    'M': 'М',
+    'B': 'Б',
+    'V': 'В',
+}
+
+# Латинские буквы, визуально совпадающие с кириллическими
+_DOCUMENT_CODE_TABLE = str.maketrans({
+    'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н',
+    'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р', 'T': 'Т',
+    'X': 'Х', 'Y': 'У',
+})
+
+
+@lru_cache(maxsize=8192)
 def normalize_process_code(code: str) -> str:
     """Нормализация кода процесса (латиница → кириллица)"""
-    mapping = {
-        'M': 'М',
-        'B': 'Б',
-        'V': 'В',
-    }
-    
     if code and len(code) >= 1:
         first_char = code[0].upper()
-        if first_char in mapping:
-            return mapping[first_char] + code[1:]
+        if first_char in _PROCESS_CODE_MAP:
+            return _PROCESS_CODE_MAP[first_char] + code[1:]
     return code
 
 
+@lru_cache(maxsize=8192)
 def normalize_document_code(code: str) -> str:
     """Нормализация кода документа для сопоставления"""
     if not code:
         return ""
-    mapping = str.maketrans({
-        'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н',
-        'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р', 'T': 'Т',
-        'X': 'Х', 'Y': 'У',
-    })
-    normalized = code.strip().upper().translate(mapping)
+    normalized = code.strip().upper().translate(_DOCUMENT_CODE_TABLE)
     return normalized
 
 
@@ -228,39 +235,49 @@ def get_process_info(process_id: str) -> Optional[dict]:
     return PROCESS_REGISTRY.get(normalized) or PROCESS_REGISTRY.get(process_id)
 
 
-def scan_documents_folder(folder_path: Path) -> List[Document]:
+def _scan_entry(item: Path) -> Optional[Document]:
+    """Разобрать один элемент папки документов (файл или подпапку)"""
+    if item.is_dir():
+        # Папка с документом (формат: "ДП-М1.020-06 ^692386...")
+        doc = parse_document_code(item.name)
+        if doc:
+            # Ищем PDF внутри папки
+            pdf_files = list(item.glob('*.pdf')) + list(item.glob('*.PDF'))
+            if pdf_files:
+                doc.file_path = str(pdf_files[0])
+        return doc
+    if item.suffix.lower() == '.pdf':
+        # PDF файл напрямую
+        doc = parse_document_code(item.name)
+        if doc:
+            doc.file_path = str(item)
+        return doc
+    return None
+
+
+def scan_documents_folder(folder_path: Path, jobs: int = 1) -> List[Document]:
     """
     Сканировать папку с документами и извлечь информацию
     
     Args:
         folder_path: Путь к папке с документами
+        jobs: Количество процессов (1 - последовательно, 0 - по числу CPU)
         
     Returns:
         Список Document
     """
-    documents = []
-    
     if not folder_path.exists():
-        return documents
+        return []
+    
+    items = list(folder_path.iterdir())
     
-    for item in folder_path.iterdir():
-        if item.is_dir():
-            # Папка с документом (формат: "ДП-М1.020-06 ^692386...")
-            doc = parse_document_code(item.name)
-            if doc:
-                # Ищем PDF внутри папки
-                pdf_files = list(item.glob('*.pdf')) + list(item.glob('*.PDF'))
-                if pdf_files:
-                    doc.file_path = str(pdf_files[0])
-                documents.append(doc)
-        elif item.suffix.lower() == '.pdf':
-            # PDF файл напрямую
-            doc = parse_document_code(item.name)
-            if doc:
-                doc.file_path = str(item)
-                documents.append(doc)
+    if jobs == 1:
+        return [doc for doc in map(_scan_entry, items) if doc]
     
-    return documents
+    # chunksize снижает накладные расходы IPC на каждый элемент
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        results = executor.map(_scan_entry, items, chunksize=16)
+        return [doc for doc in results if doc]
 
 
 if __name__ == "__main__":
@@ -41,6 +41,10 @@ REFERENCE_PATTERNS = [
     r'(?:TPM|ТРМ)-[A-ZА-Я]+-[A-ZА-Я]+-\d+-\d+',
 ]
 
+# Паттерны ищутся по отдельности: вложенные коды (ДП-Б1.002-04 внутри
+# КД-ДП-Б1.002-04) тоже считаются ссылками
+_REFERENCE_RES = [re.compile(p, re.IGNORECASE) for p in REFERENCE_PATTERNS]
+
 # Паттерны для даты
 DATE_PATTERNS = [
     # "01.01.2024", "01/01/2024"
@@ -153,14 +157,12 @@ def extract_references(text: str, self_code: str = "") -> List[str]:
     """Извлечь ссылки на другие документы"""
     references = set()
     
-    for pattern in REFERENCE_PATTERNS:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            # Нормализуем код
-            code = match.upper().replace('М', 'М').replace('Б', 'Б').replace('В', 'В')
-            # Не добавляем ссылку на себя
-            if code != self_code.upper():
-                references.add(code)
+    for pattern in _REFERENCE_RES:
+        # Нормализуем код
+        references.update(match.upper() for match in pattern.findall(text))
+    
+    # Не добавляем ссылку на себя
+    references.discard(self_code.upper())
     
     return sorted(list(references))
 
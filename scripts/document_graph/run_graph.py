@@ -31,6 +31,8 @@ def main():
     parser.add_argument('--output', '-o',
                        default='scripts/tools', 
                        help='Папка для результатов (default: scripts/tools)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                       help='Процессов для извлечения метаданных (0 = по числу CPU, default: 1)')
     
     args = parser.parse_args()
     
@@ -82,7 +84,8 @@ def main():
     print("\n📖 Извлечение метаданных...")
     extracted = builder.extract_metadata(
         docx_base_path=docx_base,
-        xlsx_catalog_path=xlsx_catalog
+        xlsx_catalog_path=xlsx_catalog,
+        jobs=args.jobs
     )
     print(f"   Обработано: {extracted} документов")
     
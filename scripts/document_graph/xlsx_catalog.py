@@ -4,8 +4,9 @@
 """
 
 import re
+from bisect import bisect_left
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -97,11 +98,29 @@ def normalize_code(code: str) -> str:
     return code
 
 
-def find_in_catalog(catalog: Dict[str, CatalogEntry], doc_code: str) -> Optional[CatalogEntry]:
+def build_prefix_index(catalog: Dict[str, CatalogEntry]) -> Tuple[List[str], List[int]]:
+    """
+    Построить индекс для поиска по префиксу кода
+    
+    Returns:
+        (отсортированные ключи, позиция каждого ключа в исходном порядке каталога)
+    """
+    order = {key: i for i, key in enumerate(catalog)}
+    keys = sorted(catalog)
+    return keys, [order[key] for key in keys]
+
+
+def find_in_catalog(catalog: Dict[str, CatalogEntry], doc_code: str,
+                    prefix_index: Tuple[List[str], List[int]] = None) -> Optional[CatalogEntry]:
     """
     Найти документ в каталоге по коду
     
     Пробует разные варианты нормализации
+    
+    Args:
+        catalog: Каталог из load_catalog
+        doc_code: Код документа
+        prefix_index: Индекс из build_prefix_index (без него - линейный перебор)
     """
     if not doc_code:
         return None
@@ -115,11 +134,23 @@ def find_in_catalog(catalog: Dict[str, CatalogEntry], doc_code: str) -> Optional
     base_code = re.sub(r'-\d+$', '', doc_code)
     normalized_base = normalize_code(base_code)
     
-    for key, entry in catalog.items():
-        if key.startswith(normalized_base):
-            return entry
+    if prefix_index is None:
+        for key, entry in catalog.items():
+            if key.startswith(normalized_base):
+                return entry
+        return None
     
-    return None
+    # Ключи с общим префиксом идут подряд; из них берём первый по порядку каталога
+    keys, positions = prefix_index
+    best_key = None
+    best_pos = len(keys)
+    i = bisect_left(keys, normalized_base)
+    while i < len(keys) and keys[i].startswith(normalized_base):
+        if positions[i] < best_pos:
+            best_key, best_pos = keys[i], positions[i]
+        i += 1
+    
+    return catalog[best_key] if best_key is not None else None
 
 
 def extract_process_name(process_str: str) -> tuple:
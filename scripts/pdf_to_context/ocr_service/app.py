@@ -15,8 +15,11 @@ import io
 from PIL import Image
 import os
 import uvicorn
+import re
+import shutil
 import tempfile
 import logging
+from contextlib import nullcontext
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +27,11 @@ logger = logging.getLogger(__name__)
 
 # Настройки CUDA
 os.environ["CUDA_VISIBLE_DEVICES"] = '0'
+TORCH_VERSION = tuple(int(part) for part in torch.__version__.split("+")[0].split(".")[:2])
+
+# Разметка DeepSeek-OCR: <|ref|>тип<|/ref|><|det|>[[x0, y0, x1, y1]]<|/det|>
+REF_DET_RE = re.compile(r"<\|ref\|>(.*?)<\|/ref\|>(?:<\|det\|>(.*?)<\|/det\|>)?")
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
 
 app = FastAPI(title="DeepSeek-OCR Service", version="1.0.0")
 
@@ -31,6 +39,10 @@ app = FastAPI(title="DeepSeek-OCR Service", version="1.0.0")
 model = None
 tokenizer = None
 model_loaded = False
+attn_implementation = 'eager'
+# Рабочая директория model.infer() (save_results=False - файлы не пишутся),
+# создаётся один раз на процесс
+ocr_output_dir = None
 
 
 class BBox(BaseModel):
@@ -57,7 +69,7 @@ class OCRResponse(BaseModel):
 
 def load_model():
     """Загрузка модели DeepSeek-OCR"""
-    global model, tokenizer, model_loaded
+    global model, tokenizer, model_loaded, attn_implementation
     
     if model_loaded:
         logger.info("✅ Модель уже загружена")
@@ -82,21 +94,29 @@ def load_model():
             attn_impl = 'flash_attention_2'
             logger.info("   ✅ flash-attn обнаружен, используем flash_attention_2")
         except ImportError:
-            attn_impl = 'eager'
+            # Встроенный FlashAttention PyTorch (F.scaled_dot_product_attention)
+            attn_impl = 'sdpa'
             if disable_flash:
-                logger.warning("   ⚠️ flash-attn отключен, используем eager attention (медленнее)")
+                logger.warning("   ⚠️ flash-attn отключен, используем SDPA attention")
             else:
-                logger.warning("   ⚠️ flash-attn не установлен, используем eager attention (медленнее)")
+                logger.warning("   ⚠️ flash-attn не установлен, используем SDPA attention")
         
-        model = AutoModel.from_pretrained(
-            model_name,
-            _attn_implementation=attn_impl,
-            torch_dtype=torch.bfloat16,  # Указываем dtype сразу
-            device_map="cuda",  # Загружаем сразу на GPU
-            trust_remote_code=True,
-            use_safetensors=True,
-            low_cpu_mem_usage=True  # Оптимизация памяти
-        )
+        load_kwargs = {
+            'torch_dtype': torch.bfloat16,  # Указываем dtype сразу
+            'device_map': "cuda",  # Загружаем сразу на GPU
+            'trust_remote_code': True,
+            'use_safetensors': True,
+            'low_cpu_mem_usage': True  # Оптимизация памяти
+        }
+        try:
+            model = AutoModel.from_pretrained(model_name, _attn_implementation=attn_impl, **load_kwargs)
+        except ValueError as e:
+            if attn_impl != 'sdpa':
+                raise
+            logger.warning(f"   ⚠️ SDPA не поддерживается моделью ({e}), используем eager attention (медленнее)")
+            attn_impl = 'eager'
+            model = AutoModel.from_pretrained(model_name, _attn_implementation=attn_impl, **load_kwargs)
+        attn_implementation = attn_impl
         model = model.eval()  # Только eval, уже на GPU и в bfloat16
         
         model_loaded = True
@@ -107,10 +127,40 @@ def load_model():
         raise
 
 
+def sdpa_context():
+    """Выбор SDPA-ядер (flash / memory-efficient, math - запасной) на время генерации"""
+    if attn_implementation != 'sdpa' or TORCH_VERSION < (2, 2):
+        return nullcontext()
+    # math остаётся последним вариантом: формы и маски, которые не берут
+    # flash / memory-efficient, не должны падать с "No available kernel"
+    if TORCH_VERSION >= (2, 3):
+        from torch.nn.attention import SDPBackend, sdpa_kernel
+        return sdpa_kernel([
+            SDPBackend.FLASH_ATTENTION,
+            SDPBackend.EFFICIENT_ATTENTION,
+            SDPBackend.MATH,
+        ])
+    # torch 2.2: sdpa_kernel ещё нет (sdp_kernel устарел начиная с 2.3)
+    return torch.backends.cuda.sdp_kernel(
+        enable_flash=True,
+        enable_math=True,
+        enable_mem_efficient=True
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     """Загрузка модели при старте сервиса"""
+    global ocr_output_dir
     load_model()
+    ocr_output_dir = tempfile.mkdtemp(prefix="ocr-")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Удаление рабочей директории OCR"""
+    if ocr_output_dir:
+        shutil.rmtree(ocr_output_dir, ignore_errors=True)
 
 
 @app.get("/")
@@ -175,179 +225,150 @@ async def ocr_figure(
             temp_path = tmp_file.name
         
         try:
-            # Создаем временную папку для результатов
-            with tempfile.TemporaryDirectory() as tmp_output:
-                # Получаем промпт
-                if custom_prompt:
-                    prompt = custom_prompt
-                    logger.info(f"   Используется custom_prompt")
-                else:
-                    # Абсолютный импорт для работы при прямом запуске
-                    try:
-                        from .prompts import OCRPrompts
-                    except ImportError:
-                        import sys
-                        from pathlib import Path
-                        sys.path.insert(0, str(Path(__file__).parent))
-                        from prompts import OCRPrompts
-                    prompt = OCRPrompts.get_prompt_by_type(prompt_type)
-                    logger.info(f"   Используется prompt_type: {prompt_type}")
-                
-                # Обработка через DeepSeek-OCR
-                logger.info(f"📄 Обработка изображения ({len(image_data)} байт)")
-                logger.info(f"🔍 Prompt: {prompt[:100]}...")
-                
-                # КРИТИЧНО: Захватываем stdout, т.к. model.infer() печатает результат туда
-                import sys
-                from io import StringIO
-                
-                old_stdout = sys.stdout
-                sys.stdout = captured_output = StringIO()
-                
+            # Получаем промпт
+            if custom_prompt:
+                prompt = custom_prompt
+                logger.info(f"   Используется custom_prompt")
+            else:
+                # Абсолютный импорт для работы при прямом запуске
                 try:
-                    res = model.infer(
-                        tokenizer,
-                        prompt=prompt,
-                        image_file=temp_path,
-                        output_path=tmp_output,
-                        base_size=base_size,
-                        image_size=image_size,
-                        crop_mode=crop_mode,
-                        save_results=False,  # Не сохраняем файлы
-                        test_compress=False
-                    )
-                finally:
-                    sys.stdout = old_stdout
-                    captured_stdout = captured_output.getvalue()
-                
-                logger.info(f"🔍 Тип результата: {type(res)}")
-                logger.info(f"🔍 Результат (первые 500 символов): {str(res)[:500]}")
-                
-                # ВАЖНО: model.infer() печатает результат в stdout, а не возвращает!
-                raw_output = ""
-                if captured_stdout and len(captured_stdout) > 100:
-                    logger.info("✅ Используем captured stdout как результат")
-                    raw_output = captured_stdout
-                elif res is not None and str(res) != "None":
-                    logger.info("✅ Используем return value как результат")
-                    raw_output = res if isinstance(res, str) else str(res)
-                elif captured_stdout:
-                    logger.info("⚠️ Return пустой, используем stdout (даже если короткий)")
-                    raw_output = captured_stdout
-                else:
-                    logger.warning("⚠️ И return и stdout пусты!")
-                    raw_output = ""
-                
-                logger.info(f"🔍 raw_output (первые 500 символов):\n{'='*21}\n{raw_output[:500]}\n{'='*21}")
-                
-                # Извлекаем markdown (упрощенный парсинг)
-                markdown_text = ""
-                blocks = []
-                
-                # Парсим вывод модели
-                lines = raw_output.split('\n')
-                current_block = None
-                block_counter = 0
-                i = 0
+                    from .prompts import OCRPrompts
+                except ImportError:
+                    import sys
+                    from pathlib import Path
+                    sys.path.insert(0, str(Path(__file__).parent))
+                    from prompts import OCRPrompts
+                prompt = OCRPrompts.get_prompt_by_type(prompt_type)
+                logger.info(f"   Используется prompt_type: {prompt_type}")
+            
+            # Обработка через DeepSeek-OCR
+            logger.info(f"📄 Обработка изображения ({len(image_data)} байт)")
+            logger.info(f"🔍 Prompt: {prompt[:100]}...")
+            
+            # eval_mode=True: model.infer() возвращает результат вместо печати в stdout
+            with sdpa_context():
+                res = model.infer(
+                    tokenizer,
+                    prompt=prompt,
+                    image_file=temp_path,
+                    output_path=ocr_output_dir,
+                    base_size=base_size,
+                    image_size=image_size,
+                    crop_mode=crop_mode,
+                    save_results=False,  # Не сохраняем файлы
+                    test_compress=False,
+                    eval_mode=True
+                )
+            
+            raw_output = res if isinstance(res, str) else ""
+            if not raw_output:
+                logger.warning("⚠️ model.infer() вернул пустой результат!")
+            
+            logger.info(f"🔍 raw_output (первые 500 символов):\n{'='*21}\n{raw_output[:500]}\n{'='*21}")
+            
+            # Извлекаем markdown (упрощенный парсинг)
+            markdown_text = ""
+            blocks = []
+            
+            # Парсим вывод модели
+            lines = raw_output.split('\n')
+            current_block = None
+            block_counter = 0
+            i = 0
+            
+            while i < len(lines):
+                line = lines[i]
                 
-                while i < len(lines):
-                    line = lines[i]
+                # Детектируем ref и det теги (для ocr_simple)
+                if '<|ref|>' in line:
+                    # Сохраняем предыдущий блок
+                    if current_block and current_block['content'].strip():
+                        blocks.append(current_block)
                     
-                    # Детектируем ref и det теги (для ocr_simple)
-                    if '<|ref|>' in line:
-                        # Сохраняем предыдущий блок
-                        if current_block and current_block['content'].strip():
-                            blocks.append(current_block)
-                        
-                        # Извлекаем тип элемента из <|ref|>...<|/ref|>
-                        ref_type = line.split('<|ref|>')[1].split('<|/ref|>')[0]
-                        
-                        # Извлекаем bbox если есть
-                        bbox_data = [0, 0, 100, 100]  # default
-                        if '<|det|>' in line:
-                            det_str = line.split('<|det|>')[1].split('<|/det|>')[0]
-                            try:
-                                import ast
-                                bbox_list = ast.literal_eval(det_str)
-                                if bbox_list and len(bbox_list) > 0:
-                                    bbox_data = bbox_list[0]
-                            except:
-                                pass
-                        
-                        # ИСПРАВЛЕНИЕ: Текст находится на СЛЕДУЮЩЕЙ строке после <|ref|><|det|>
-                        actual_text = ""
-                        if i + 1 < len(lines):
-                            next_line = lines[i + 1].strip()
-                            # Если следующая строка НЕ начинается с тега - это текст
-                            if next_line and not next_line.startswith('<|') and not next_line.startswith('==='):
-                                actual_text = next_line
-                                i += 1  # Пропускаем строку с текстом
-                        
-                        if actual_text:  # Добавляем блок только если есть текст
-                            current_block = {
-                                'id': f'ocr_block_{block_counter}',
-                                'type': ref_type,  # Тип: text, title и т.д.
-                                'content': actual_text,  # ИСПРАВЛЕНО: Реальный текст со следующей строки
-                                'bbox': {
-                                    'x0': float(bbox_data[0]),
-                                    'y0': float(bbox_data[1]),
-                                    'x1': float(bbox_data[2]),
-                                    'y1': float(bbox_data[3])
-                                },
-                                'confidence': 1.0,
-                                'metadata': {}
-                            }
-                            block_counter += 1
-                            markdown_text += actual_text + '\n'
-                            
-                            # Добавляем блок сразу
-                            blocks.append(current_block)
-                            current_block = None
+                    # Извлекаем тип элемента и bbox (первый бокс из <|det|>)
+                    bbox_data = [0, 0, 100, 100]  # default
+                    ref_type = 'text'
+                    match = REF_DET_RE.search(line)
+                    if match:
+                        ref_type = match.group(1)
+                        coords = NUMBER_RE.findall(match.group(2) or '')
+                        if len(coords) >= 4:
+                            bbox_data = coords[:4]
                     
-                    elif not line.startswith('<|') and not line.startswith('===') and line.strip():
-                        # Текст без тегов - добавляем к markdown (кроме служебных)
-                        if not line.strip().startswith('BASE:') and not line.strip().startswith('NO PATCHES'):
-                            markdown_text += line.strip() + '\n'
+                    # ИСПРАВЛЕНИЕ: Текст находится на СЛЕДУЮЩЕЙ строке после <|ref|><|det|>
+                    actual_text = ""
+                    if i + 1 < len(lines):
+                        next_line = lines[i + 1].strip()
+                        # Если следующая строка НЕ начинается с тега - это текст
+                        if next_line and not next_line.startswith('<|') and not next_line.startswith('==='):
+                            actual_text = next_line
+                            i += 1  # Пропускаем строку с текстом
                     
-                    i += 1
+                    if actual_text:  # Добавляем блок только если есть текст
+                        current_block = {
+                            'id': f'ocr_block_{block_counter}',
+                            'type': ref_type,  # Тип: text, title и т.д.
+                            'content': actual_text,  # ИСПРАВЛЕНО: Реальный текст со следующей строки
+                            'bbox': {
+                                'x0': float(bbox_data[0]),
+                                'y0': float(bbox_data[1]),
+                                'x1': float(bbox_data[2]),
+                                'y1': float(bbox_data[3])
+                            },
+                            'confidence': 1.0,
+                            'metadata': {}
+                        }
+                        block_counter += 1
+                        markdown_text += actual_text + '\n'
+                        
+                        # Добавляем блок сразу
+                        blocks.append(current_block)
+                        current_block = None
                 
-                # Добавляем последний блок
-                if current_block and current_block['content'].strip():
-                    blocks.append(current_block)
+                elif not line.startswith('<|') and not line.startswith('===') and line.strip():
+                    # Текст без тегов - добавляем к markdown (кроме служебных)
+                    if not line.strip().startswith('BASE:') and not line.strip().startswith('NO PATCHES'):
+                        markdown_text += line.strip() + '\n'
                 
-                # Если нет структурированных блоков, но есть raw_output,
-                # создаем один блок с описанием (для parse_figure, describe)
-                if not blocks and raw_output.strip():
-                    # Фильтруем служебные сообщения (BASE:, NO PATCHES, ===)
-                    clean_lines = []
-                    for line in raw_output.split('\n'):
-                        line_stripped = line.strip()
-                        if (line_stripped and 
-                            not line_stripped.startswith('===') and 
-                            not line_stripped.startswith('BASE:') and 
-                            not line_stripped.startswith('NO PATCHES')):
-                            clean_lines.append(line_stripped)
-                    
-                    description = '\n'.join(clean_lines).strip()
-                    
-                    if description:
-                        blocks.append({
-                            'id': 'ocr_block_description',
-                            'type': 'text',
-                            'content': description,
-                            'bbox': {'x0': 0, 'y0': 0, 'x1': 100, 'y1': 100},
-                            'confidence': 0.8
-                        })
-                        markdown_text = description
+                i += 1
+            
+            # Добавляем последний блок
+            if current_block and current_block['content'].strip():
+                blocks.append(current_block)
+            
+            # Если нет структурированных блоков, но есть raw_output,
+            # создаем один блок с описанием (для parse_figure, describe)
+            if not blocks and raw_output.strip():
+                # Фильтруем служебные сообщения (BASE:, NO PATCHES, ===)
+                clean_lines = []
+                for line in raw_output.split('\n'):
+                    line_stripped = line.strip()
+                    if (line_stripped and 
+                        not line_stripped.startswith('===') and 
+                        not line_stripped.startswith('BASE:') and 
+                        not line_stripped.startswith('NO PATCHES')):
+                        clean_lines.append(line_stripped)
                 
-                logger.info(f"✅ Распознано {len(blocks)} блоков")
+                description = '\n'.join(clean_lines).strip()
                 
-                return OCRResponse(
-                    blocks=[OCRBlock(**block) for block in blocks],
-                    markdown=markdown_text.strip(),
-                    raw_output=raw_output
-                )
-        
+                if description:
+                    blocks.append({
+                        'id': 'ocr_block_description',
+                        'type': 'text',
+                        'content': description,
+                        'bbox': {'x0': 0, 'y0': 0, 'x1': 100, 'y1': 100},
+                        'confidence': 0.8
+                    })
+                    markdown_text = description
+            
+            logger.info(f"✅ Распознано {len(blocks)} блоков")
+            
+            return OCRResponse(
+                blocks=[OCRBlock(**block) for block in blocks],
+                markdown=markdown_text.strip(),
+                raw_output=raw_output
+            )
+    
         finally:
             # Удаляем временный файл
             if os.path.exists(temp_path):
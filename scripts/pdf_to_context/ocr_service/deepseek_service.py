@@ -28,6 +28,8 @@ class DeepSeekOCRService(OCRService):
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
         self._available = None
+        # Keep-alive сессия: одно TCP-соединение на все фигуры документа
+        self._session = requests.Session()
     
     def is_available(self) -> bool:
         """Проверка доступности DeepSeek-OCR сервиса"""
@@ -35,7 +37,7 @@ class DeepSeekOCRService(OCRService):
             return self._available
         
         try:
-            response = requests.get(
+            response = self._session.get(
                 f"{self.base_url}/health",
                 timeout=5
             )
@@ -79,7 +81,7 @@ class DeepSeekOCRService(OCRService):
             }
             
             # Отправка запроса
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/ocr/figure",
                 files=files,
                 data=data,
@@ -2,6 +2,49 @@
 Специализированные промпты для разных типов контента
 """
 
+# Промпты как модульные константы: get_prompt_by_type делает один lookup
+# в словаре вместо вызова всех get_*_prompt() и сборки dict на каждый запрос
+_DEFAULT_PROMPT = "<image>\n<|grounding|>Convert the document to markdown."
+_BPMN_DIAGRAM_PROMPT = "<image>\n<|grounding|>Convert the BPMN diagram to markdown. Include all text from shapes, gateways, and events."
+_COMPLEX_DIAGRAM_PROMPT = "<image>\n<|grounding|>Convert the diagram to markdown. Extract all text from boxes, connections, and annotations."
+_TABLE_PROMPT = "<image>\n<|grounding|>Convert the table to markdown format with all rows and columns."
+_TEXT_WITH_GRAPHICS_PROMPT = "<image>\n<|grounding|>Convert the document to markdown including text, diagrams, and tables."
+_PARSE_FIGURE_PROMPT = "<image>\nParse the figure."
+_FREE_OCR_PROMPT = "<image>\nFree OCR."
+_DESCRIBE_PROMPT = "<image>\nDescribe this image in detail."
+_OCR_SIMPLE_PROMPT = "<image>\n<|grounding|>OCR this image."
+_RUSSIAN_LAYOUT_PROMPT = "<image>\n<|grounding|>Language: Russian. Extract all text with coordinates."
+_RUSSIAN_BPMN_PROMPT = "<image>\n<|grounding|>Language: Russian. This is a BPMN diagram. Extract all text from diagram elements with coordinates."
+_RUSSIAN_PRESERVE_PROMPT = "<image>\n<|grounding|>Russian text (Cyrillic). Preserve characters exactly. Extract with coordinates."
+_RUSSIAN_FULL_PROMPT = "<image>\n<|grounding|>Language: Russian (Cyrillic). BPMN diagram. Extract text from boxes, circles, arrows. Provide coordinates."
+_RUSSIAN_SIMPLE_PROMPT = "<image>\n<|grounding|>Russian. OCR with coordinates."
+_GATEWAY_FOCUSED_PROMPT = "<image>\n<|grounding|>Convert the diagram to markdown. Focus on gateway conditions and decision points."
+_EVENTS_FOCUSED_PROMPT = "<image>\n<|grounding|>Convert the diagram to markdown. Focus on events and their labels."
+_LANES_FOCUSED_PROMPT = "<image>\n<|grounding|>Convert the diagram to markdown. Focus on pools, lanes, and role assignments."
+
+_PROMPT_BY_TYPE = {
+    # Наши кастомные промпты:
+    'bpmn': _BPMN_DIAGRAM_PROMPT,
+    'complex_diagram': _COMPLEX_DIAGRAM_PROMPT,
+    'table': _TABLE_PROMPT,
+    'text_graphics': _TEXT_WITH_GRAPHICS_PROMPT,
+    'default': _DEFAULT_PROMPT,
+
+    # ОФИЦИАЛЬНЫЕ промпты из DeepSeek-OCR:
+    'parse_figure': _PARSE_FIGURE_PROMPT,  # ⭐⭐⭐ Для диаграмм
+    'free_ocr': _FREE_OCR_PROMPT,
+    'describe': _DESCRIBE_PROMPT,
+    'ocr_simple': _OCR_SIMPLE_PROMPT,
+
+    # РУССКИЕ промпты (Эксперимент 31.10.2025):
+    'russian_layout': _RUSSIAN_LAYOUT_PROMPT,  # ⭐⭐⭐⭐ Базовый
+    'russian_bpmn': _RUSSIAN_BPMN_PROMPT,  # ⭐⭐⭐⭐⭐ Для BPMN
+    'russian_preserve': _RUSSIAN_PRESERVE_PROMPT,  # ⭐⭐⭐ Агрессивный
+    'russian_full': _RUSSIAN_FULL_PROMPT,  # ⭐⭐⭐ Детальный
+    'russian_simple': _RUSSIAN_SIMPLE_PROMPT,  # ⭐⭐⭐⭐ KISS
+}
+
+
 class OCRPrompts:
     """
     Коллекция промптов для DeepSeek-OCR
@@ -14,7 +57,7 @@ class OCRPrompts:
     @staticmethod
     def get_default_prompt() -> str:
         """Базовый промпт для общего OCR"""
-        return "<image>\n<|grounding|>Convert the document to markdown."
+        return _DEFAULT_PROMPT
     
     @staticmethod
     def get_bpmn_diagram_prompt() -> str:
@@ -24,7 +67,7 @@ class OCRPrompts:
         ВАЖНО: Промпты для DeepSeek-OCR должны быть ПРОСТЫМИ и КОРОТКИМИ!
         Модель лучше работает с минимальными инструкциями.
         """
-        return "<image>\n<|grounding|>Convert the BPMN diagram to markdown. Include all text from shapes, gateways, and events."
+        return _BPMN_DIAGRAM_PROMPT
     
     @staticmethod
     def get_complex_diagram_prompt() -> str:
@@ -33,17 +76,17 @@ class OCRPrompts:
         
         ВАЖНО: Короткие промпты работают лучше!
         """
-        return "<image>\n<|grounding|>Convert the diagram to markdown. Extract all text from boxes, connections, and annotations."
+        return _COMPLEX_DIAGRAM_PROMPT
     
     @staticmethod
     def get_table_prompt() -> str:
         """Промпт для извлечения таблиц"""
-        return "<image>\n<|grounding|>Convert the table to markdown format with all rows and columns."
+        return _TABLE_PROMPT
     
     @staticmethod
     def get_text_with_graphics_prompt() -> str:
         """Промпт для страниц с текстом + встроенной графикой"""
-        return "<image>\n<|grounding|>Convert the document to markdown including text, diagrams, and tables."
+        return _TEXT_WITH_GRAPHICS_PROMPT
     
     @staticmethod
     def get_parse_figure_prompt() -> str:
@@ -51,7 +94,7 @@ class OCRPrompts:
         ОФИЦИАЛЬНЫЙ промпт для парсинга графиков/диаграмм
         Источник: DeepSeek-OCR config.py, режим 4
         """
-        return "<image>\nParse the figure."
+        return _PARSE_FIGURE_PROMPT
     
     @staticmethod
     def get_free_ocr_prompt() -> str:
@@ -59,7 +102,7 @@ class OCRPrompts:
         ОФИЦИАЛЬНЫЙ промпт для свободного OCR (без layout)
         Источник: DeepSeek-OCR config.py, режим 2
         """
-        return "<image>\nFree OCR."
+        return _FREE_OCR_PROMPT
     
     @staticmethod
     def get_describe_prompt() -> str:
@@ -67,7 +110,7 @@ class OCRPrompts:
         ОФИЦИАЛЬНЫЙ промпт для детального описания изображения
         Источник: DeepSeek-OCR config.py, режим 5
         """
-        return "<image>\nDescribe this image in detail."
+        return _DESCRIBE_PROMPT
     
     @staticmethod
     def get_ocr_simple_prompt() -> str:
@@ -75,7 +118,7 @@ class OCRPrompts:
         ОФИЦИАЛЬНЫЙ промпт для простого OCR
         Источник: DeepSeek-OCR официальная документация
         """
-        return "<image>\n<|grounding|>OCR this image."
+        return _OCR_SIMPLE_PROMPT
     
     # ==================== РУССКИЕ ПРОМПТЫ ====================
     # Добавлено: 31.10.2025 - Эксперимент с явным указанием языка
@@ -88,7 +131,7 @@ class OCRPrompts:
         ГИПОТЕЗА: Явное указание "Language: Russian" заставит модель
         корректно обрабатывать кириллицу без транслитерации
         """
-        return "<image>\n<|grounding|>Language: Russian. Extract all text with coordinates."
+        return _RUSSIAN_LAYOUT_PROMPT
     
     @staticmethod
     def get_russian_bpmn_prompt() -> str:
@@ -97,7 +140,7 @@ class OCRPrompts:
         
         Комбинирует: указание языка + тип контента + требование координат
         """
-        return "<image>\n<|grounding|>Language: Russian. This is a BPMN diagram. Extract all text from diagram elements with coordinates."
+        return _RUSSIAN_BPMN_PROMPT
     
     @staticmethod
     def get_russian_preserve_cyrillic_prompt() -> str:
@@ -106,7 +149,7 @@ class OCRPrompts:
         
         Более агрессивная формулировка для критичных случаев
         """
-        return "<image>\n<|grounding|>Russian text (Cyrillic). Preserve characters exactly. Extract with coordinates."
+        return _RUSSIAN_PRESERVE_PROMPT
     
     @staticmethod
     def get_russian_diagram_full_prompt() -> str:
@@ -115,7 +158,7 @@ class OCRPrompts:
         
         Включает: язык + тип + инструкции + координаты
         """
-        return "<image>\n<|grounding|>Language: Russian (Cyrillic). BPMN diagram. Extract text from boxes, circles, arrows. Provide coordinates."
+        return _RUSSIAN_FULL_PROMPT
     
     @staticmethod
     def get_russian_simple_prompt() -> str:
@@ -124,7 +167,7 @@ class OCRPrompts:
         
         KISS принцип - минимум слов, максимум эффект
         """
-        return "<image>\n<|grounding|>Russian. OCR with coordinates."
+        return _RUSSIAN_SIMPLE_PROMPT
     
     @staticmethod
     def get_prompt_by_type(content_type: str) -> str:
@@ -141,29 +184,7 @@ class OCRPrompts:
         Returns:
             Appropriate prompt string
         """
-        prompts = {
-            # Наши кастомные промпты:
-            'bpmn': OCRPrompts.get_bpmn_diagram_prompt(),
-            'complex_diagram': OCRPrompts.get_complex_diagram_prompt(),
-            'table': OCRPrompts.get_table_prompt(),
-            'text_graphics': OCRPrompts.get_text_with_graphics_prompt(),
-            'default': OCRPrompts.get_default_prompt(),
-            
-            # ОФИЦИАЛЬНЫЕ промпты из DeepSeek-OCR:
-            'parse_figure': OCRPrompts.get_parse_figure_prompt(),    # ⭐⭐⭐ Для диаграмм
-            'free_ocr': OCRPrompts.get_free_ocr_prompt(),
-            'describe': OCRPrompts.get_describe_prompt(),
-            'ocr_simple': OCRPrompts.get_ocr_simple_prompt(),
-            
-            # РУССКИЕ промпты (Эксперимент 31.10.2025):
-            'russian_layout': OCRPrompts.get_russian_layout_ocr_prompt(),       # ⭐⭐⭐⭐ Базовый
-            'russian_bpmn': OCRPrompts.get_russian_bpmn_prompt(),               # ⭐⭐⭐⭐⭐ Для BPMN
-            'russian_preserve': OCRPrompts.get_russian_preserve_cyrillic_prompt(),  # ⭐⭐⭐ Агрессивный
-            'russian_full': OCRPrompts.get_russian_diagram_full_prompt(),       # ⭐⭐⭐ Детальный
-            'russian_simple': OCRPrompts.get_russian_simple_prompt(),           # ⭐⭐⭐⭐ KISS
-        }
-        
-        return prompts.get(content_type, OCRPrompts.get_default_prompt())
+        return _PROMPT_BY_TYPE.get(content_type, _DEFAULT_PROMPT)
 
 
 class BPMNPrompts:
@@ -176,15 +197,14 @@ class BPMNPrompts:
     @staticmethod
     def get_gateway_focused_prompt() -> str:
         """Промпт с фокусом на шлюзы и условия"""
-        return "<image>\n<|grounding|>Convert the diagram to markdown. Focus on gateway conditions and decision points."
+        return _GATEWAY_FOCUSED_PROMPT
     
     @staticmethod
     def get_events_focused_prompt() -> str:
         """Промпт с фокусом на события"""
-        return "<image>\n<|grounding|>Convert the diagram to markdown. Focus on events and their labels."
+        return _EVENTS_FOCUSED_PROMPT
     
     @staticmethod
     def get_lanes_focused_prompt() -> str:
         """Промпт с фокусом на дорожки и роли"""
-        return "<image>\n<|grounding|>Convert the diagram to markdown. Focus on pools, lanes, and role assignments."
-
+        return _LANES_FOCUSED_PROMPT
@@ -47,6 +47,8 @@ class QwenRemoteService(OCRService):
         self.language = language
         self._available = None
         self._model_info = None
+        # Keep-alive сессия: одно TCP-соединение на все запросы к сервису
+        self._session = requests.Session()
     
     def is_available(self) -> bool:
         """Проверка доступности сервиса"""
@@ -54,7 +56,7 @@ class QwenRemoteService(OCRService):
             return self._available
         
         try:
-            response = requests.get(
+            response = self._session.get(
                 f"{self.base_url}/health",
                 timeout=5
             )
@@ -75,7 +77,7 @@ class QwenRemoteService(OCRService):
             return self._model_info
         
         try:
-            response = requests.get(
+            response = self._session.get(
                 f"{self.base_url}/info",
                 timeout=5
             )
@@ -121,7 +123,7 @@ class QwenRemoteService(OCRService):
             payload["max_tokens"] = max_tokens
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/ocr",
                 json=payload,
                 timeout=self.timeout
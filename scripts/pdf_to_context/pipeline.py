@@ -19,7 +19,7 @@ PDF to Context Pipeline - главный оркестратор
 - KISS: Один путь обработки вместо маршрутизации
 """
 
-from typing import Optional
+from typing import Optional, Set
 from pathlib import Path
 
 from .core.parser import PDFParser
@@ -178,19 +178,25 @@ class PDFToContextPipeline:
                 print(f"   ℹ️  OCR сервис не доступен ({ocr_base_url})")
             return False
     
-    def process(self, pdf_path: str, output_path: Optional[str] = None) -> str:
+    def process(self, pdf_path: str, output_path: Optional[str] = None,
+                skip_ocr_pages: Optional[Set[int]] = None) -> str:
         """
         Обработать PDF документ (НОВАЯ АРХИТЕКТУРА)
         
         Args:
             pdf_path: Путь к PDF файлу
             output_path: Путь для сохранения Markdown (опционально)
+            skip_ocr_pages: Номера страниц (с 0), для которых OCR графики не выполняется
+                           (страницы с полным нативным текстом и декоративной графикой)
         
         Returns:
             Markdown строка
         """
         print(f"🚀 Начало обработки: {pdf_path}")
         print(f"   Режим: {'Native + OCR' if self.enable_ocr else 'Native only'}")
+        if self.enable_ocr and skip_ocr_pages:
+            print(f"   OCR пропускается для {len(skip_ocr_pages)} страниц с нативным текстом")
+        skip_ocr_pages = skip_ocr_pages or set()
         
         # 1. Открытие PDF
         with PDFParser(pdf_path) as parser:
@@ -216,7 +222,8 @@ class PDFToContextPipeline:
                     
                     # ШАГ 2: StructurePreserver - встраивание OCR
                     # Обрабатываем изображения и векторную графику с needs_ocr=True
-                    if self.enable_ocr and (page_data["image_blocks"] or page_data["drawing_blocks"]):
+                    if (self.enable_ocr and page_num not in skip_ocr_pages
+                            and (page_data["image_blocks"] or page_data["drawing_blocks"])):
                         print(" → ocr", end="")
                         
                         # Объединяем все блоки для обработки
@@ -326,6 +333,11 @@ class PDFToContextPipeline:
             
             return ir
     
+    @property
+    def last_page_count(self) -> int:
+        """Количество страниц последнего обработанного документа (без повторного открытия PDF)"""
+        return self._stats["total_pages"]
+    
     def health_check(self) -> dict:
         """
         Проверка работоспособности пайплайна